@@ -0,0 +1,81 @@
+import subprocess
+import sys
+import time
+
+from kernel import numba_enabled
+from multiline import MultiLineProductionSimulation
+from sim import TransitionConfig, TransitionParams, StochasticProductionSimulation
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("matplotlib", "seaborn", "pandas", "graphviz", "plotly") if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+def measure_import_time(module, repeats=5):
+    """Import `module` in fresh interpreters and return (best seconds, heavy modules loaded)"""
+    timings = []
+    heavy = ""
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(out[0]))
+        heavy = out[1] if len(out) > 1 else ""
+    return min(timings), heavy
+
+def create_config():
+    return TransitionConfig(
+        produce=TransitionParams(40.0, 5.0),
+        work=TransitionParams(20.0, 10.0),
+        process1=TransitionParams(30.0, 10.0),
+        process2=TransitionParams(30.0, 10.0),
+        tool_occupy=TransitionParams(5.0, 0.0),
+        tool_release=TransitionParams(50.0, 20.0),
+        tool_occupied_ratio=0.15,
+        tool_occupied_ratio_decay_rate=0.8
+    )
+
+def time_replications(sim, num_simulations, keep_traces=True, repeats=3):
+    """Best time per replication of `repeats` Monte Carlo batches"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sim.run_monte_carlo(num_simulations=num_simulations, keep_traces=keep_traces)
+        timings.append((time.perf_counter() - start) / num_simulations)
+    return min(timings)
+
+def main():
+    print("Import time (fresh interpreter, best of 5):")
+    for module in ["petrinet", "sim"]:
+        seconds, heavy = measure_import_time(module)
+        print(f"  {module}: {seconds * 1000:.1f} ms (heavy modules loaded: {heavy or 'none'})")
+
+    print(f"\nSimulation time per replication (8h, numba {'enabled' if numba_enabled() else 'not available'}):")
+    timings = {}
+    for engine in ["reference", "kernel"]:
+        sim = StochasticProductionSimulation(create_config(), simulation_duration=3600.0 * 8.0, engine=engine)
+        sim.run_single_simulation()  # warm-up (JIT compilation)
+        for keep_traces in [True, False]:
+            timings[engine, keep_traces] = time_replications(sim, num_simulations=20, keep_traces=keep_traces)
+            print(f"  {engine} (keep_traces={keep_traces}): {timings[engine, keep_traces] * 1000:.1f} ms")
+    for keep_traces in [True, False]:
+        speedup = timings["reference", keep_traces] / timings["kernel", keep_traces]
+        print(f"  kernel speedup (keep_traces={keep_traces}): {speedup:.1f}x")
+
+    print("\nEvent-driven multi-line engine (8h, shared tool and robot1):")
+    for num_lines in [1, 10, 100]:
+        sim = MultiLineProductionSimulation(create_config(), num_lines=num_lines,
+                                            simulation_duration=3600.0 * 8.0, shared=["tool", "robot1"])
+        start = time.perf_counter()
+        results = sim.run_single_simulation(seed=0)
+        elapsed = time.perf_counter() - start
+        print(f"  {num_lines:>3} lines: {elapsed * 1000:.0f} ms, "
+              f"{elapsed / results.num_events * 1e6:.1f} us/event")
+
+if __name__ == "__main__":
+    main()
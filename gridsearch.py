@@ -44,7 +44,7 @@ def run_grid_search():
         sim = StochasticProductionSimulation(config, simulation_duration=3600.0*8.0)
         
         for _ in range(n_runs):
-            results_run = sim.run_monte_carlo(num_simulations=10)
+            results_run = sim.run_monte_carlo(num_simulations=10, keep_traces=False)
             for buffer, size in results_run.buffer_sizes.items():
                 buffer_sizes[buffer].append(size)
         
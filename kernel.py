@@ -0,0 +1,236 @@
+"""Array kernel for the time-stepped production line simulation.
+
+The kernel runs the same per-second loop as
+StochasticProductionSimulation.run_single_simulation, but on a CompiledNet
+(integer marking and CSR arc arrays) instead of Place/Transition objects.
+It is JIT-compiled with Numba when Numba is installed and otherwise runs as
+plain Python over lists. Random numbers are drawn by the caller and
+passed in, so both engines consume exactly the same stream.
+"""
+import importlib.util
+import math
+
+import numpy as np
+
+# Numba itself is only imported on the first kernel call, which keeps it out of
+# the import time of sim.py. Until then this only says that Numba is installed;
+# use numba_enabled() to know whether it actually imports.
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+
+
+def simulate_line_py(marking, next_fire, fired, buffer_max, counters, capacity, start_step, watch_place,
+                     watch_level, record, pre_ptr, pre_place, pre_cost, post_ptr, post_place, post_cost,
+                     order, occupy, work, tool, buffers, mean_time, time_sd, n_steps, occupy_prob,
+                     uniforms, normal_base, normal_ptr, normals):
+    """Simulate one replication of L copies of the line from `start_step`,
+    mutating `marking`, `next_fire` (the earliest time each transition may
+    fire again) and `fired` (firings per transition) in place.
+
+    The copies share the net, the timing parameters and the random numbers
+    but have their own state and capacities: every per-place argument
+    (`marking`, `capacity`) holds L consecutive blocks of one entry per
+    place, and likewise per transition (`next_fire`, `fired`), per buffer
+    (`buffer_max`) and per counter (`counters`). With L = 1 this is a single
+    line; with L > 1 the copies are advanced together over common random
+    numbers, e.g. to compare capacity vectors.
+
+    Only `len()` and `[i]` indexing are used on the inputs, so the same code
+    runs under Numba on arrays and in pure Python on lists (see
+    simulate_line_lists).
+
+    `order` lists the transitions tried every second after the stochastic
+    `occupy` transition, which fires with probability
+    `occupy_prob[step - start_step]` at each of the `n_steps` seconds of the
+    run, decided by `uniforms[step - start_step]`. The k-th firing of
+    transition `t` is delayed by `normals[normal_ptr[t] + k - normal_base[t]]`
+    standard deviations. The per-step arguments and the random numbers only
+    cover a window of the run: it stops for a refill at the end of the
+    uniforms, or at the start of the step after some copy used the last
+    normal of a transition's window.
+
+    A transition is disabled if firing it would leave one of its output
+    places above `capacity` (-1 for unbounded), i.e. blocking before service.
+
+    After a second in which nothing fired, the marking cannot change before
+    the next timer expires or tool occupation succeeds, so the seconds in
+    between are skipped (only filling in the traces and statistics).
+
+    If `watch_place` is non-negative, the run stops at the start of the first
+    step where that place holds at least `watch_level` tokens in any copy,
+    leaving the state as it was at that moment so the run can be resumed
+    from it.
+
+    Whether or not traces are recorded, `buffer_max` is raised to the
+    highest level of each buffer seen at the start of a step, and
+    `counters` accumulates the seconds the tool was unavailable at the start
+    of a step (counter 0) and the `work` firings while it was available
+    (counter 1).
+
+    Returns (stop_step, refill, buffer_levels, tool_state, event_step,
+    event_transition, n_events). `stop_step` is `n_steps` if the run
+    was not stopped; `refill` tells whether it stopped for more random
+    numbers, after which it can be resumed at `stop_step`. The traces are
+    empty unless `record` is set and are indexed by `step - start_step` and
+    valid up to `stop_step`; `buffer_levels` has one row per copy and buffer
+    and `tool_state` one row per copy. Events are identified by
+    `copy * n_transitions + t` and are only valid up to `n_events`.
+    """
+    n_transitions = len(pre_ptr) - 1
+    n_lines = len(next_fire) // n_transitions
+    n_places = len(marking) // n_lines
+    n_buffers = len(buffers)
+    end_step = min(n_steps, start_step + len(uniforms))
+    n_recorded = end_step - start_step if record else 0
+    buffer_levels = np.empty((n_lines * n_buffers, n_recorded), dtype=np.int64)
+    tool_state = np.empty((n_lines, n_recorded), dtype=np.bool_)
+    # Every firing consumes a normal, which bounds the number of events
+    n_event_slots = n_lines * len(normals) if record else 0
+    event_step = np.empty(n_event_slots, dtype=np.int64)
+    event_transition = np.empty(n_event_slots, dtype=np.int64)
+    n_events = 0
+
+    normals_low = False
+    step = start_step
+    while step < end_step:
+        if normals_low:
+            return step, True, buffer_levels, tool_state, event_step, event_transition, n_events
+        if watch_place >= 0:
+            for line in range(n_lines):
+                if marking[line * n_places + watch_place] >= watch_level:
+                    return step, False, buffer_levels, tool_state, event_step, event_transition, n_events
+        current_time = float(step)
+        offset = step - start_step
+        occupy_drawn = uniforms[offset] < occupy_prob[offset]
+        any_fired = False
+
+        for line in range(n_lines):
+            p0 = line * n_places
+            t0 = line * n_transitions
+            tool_available = marking[p0 + tool] == 1
+            if not tool_available:
+                counters[2 * line] += 1
+            for b in range(n_buffers):
+                level = marking[p0 + buffers[b]]
+                if level > buffer_max[line * n_buffers + b]:
+                    buffer_max[line * n_buffers + b] = level
+                if record:
+                    buffer_levels[line * n_buffers + b, offset] = level
+            if record:
+                tool_state[line, offset] = tool_available
+
+            for i in range(-1, len(order)):
+                t = occupy if i < 0 else order[i]
+                if current_time < next_fire[t0 + t]:
+                    continue
+                if i < 0 and not (marking[p0 + tool] > 0 and occupy_drawn):
+                    continue
+                enabled = True
+                for k in range(pre_ptr[t], pre_ptr[t + 1]):
+                    if marking[p0 + pre_place[k]] < pre_cost[k]:
+                        enabled = False
+                        break
+                if not enabled:
+                    continue
+                for k in range(pre_ptr[t], pre_ptr[t + 1]):
+                    marking[p0 + pre_place[k]] -= pre_cost[k]
+                for k in range(post_ptr[t], post_ptr[t + 1]):
+                    marking[p0 + post_place[k]] += post_cost[k]
+                for k in range(post_ptr[t], post_ptr[t + 1]):
+                    room = capacity[p0 + post_place[k]]
+                    if room >= 0 and marking[p0 + post_place[k]] > room:
+                        enabled = False
+                        break
+                if not enabled:
+                    # Blocked by a full output place: undo the tentative firing
+                    for k in range(post_ptr[t], post_ptr[t + 1]):
+                        marking[p0 + post_place[k]] -= post_cost[k]
+                    for k in range(pre_ptr[t], pre_ptr[t + 1]):
+                        marking[p0 + pre_place[k]] += pre_cost[k]
+                    continue
+                k = normal_ptr[t] + fired[t0 + t] - normal_base[t]
+                next_fire[t0 + t] = current_time + max(1.0, mean_time[t] + time_sd[t] * normals[k])
+                fired[t0 + t] += 1
+                if k + 1 >= normal_ptr[t + 1]:
+                    normals_low = True
+                any_fired = True
+                if t == work and tool_available:
+                    counters[2 * line + 1] += 1
+                if record:
+                    event_step[n_events] = step
+                    event_transition[n_events] = t0 + t
+                    n_events += 1
+
+        next_step = step + 1
+        if not any_fired:
+            # Every transition whose timer has expired is disabled and stays so
+            # while the markings are unchanged
+            next_step = end_step
+            occupy_waiting = False
+            for line in range(n_lines):
+                t0 = line * n_transitions
+                for t in range(n_transitions):
+                    if next_fire[t0 + t] > current_time:
+                        next_step = min(next_step, int(math.ceil(next_fire[t0 + t])))
+                if marking[line * n_places + tool] > 0 and next_fire[t0 + occupy] <= current_time:
+                    occupy_waiting = True
+            if occupy_waiting:
+                for s in range(step + 1, next_step):
+                    if uniforms[s - start_step] < occupy_prob[s - start_step]:
+                        next_step = s
+                        break
+            for line in range(n_lines):
+                tool_available = marking[line * n_places + tool] == 1
+                if not tool_available:
+                    counters[2 * line] += next_step - step - 1
+                if record:
+                    for s in range(offset + 1, next_step - start_step):
+                        for b in range(line * n_buffers, (line + 1) * n_buffers):
+                            buffer_levels[b, s] = buffer_levels[b, offset]
+                        tool_state[line, s] = tool_available
+        step = next_step
+
+    return end_step, end_step < n_steps, buffer_levels, tool_state, event_step, event_transition, n_events
+
+
+def simulate_line_lists(marking, next_fire, fired, buffer_max, counters, *args):
+    """Pure-Python fallback for simulate_line.
+
+    Element access on NumPy arrays is much slower than on lists outside of
+    compiled code, so the inputs are converted with `tolist()` first and the
+    final state is copied back into the mutable arguments.
+    """
+    state = [a.tolist() for a in (marking, next_fire, fired, buffer_max, counters)]
+    result = simulate_line_py(*state, *[a.tolist() if isinstance(a, np.ndarray) else a for a in args])
+    for array, values in zip((marking, next_fire, fired, buffer_max, counters), state):
+        array[:] = values
+    return result
+
+
+_simulate_line_impl = None
+
+def _load_simulate_line():
+    """Pick the kernel implementation on first use. Numba may be installed
+    but fail to import (e.g. when built against another NumPy version), in
+    which case the pure-Python fallback is used and HAVE_NUMBA is cleared."""
+    global _simulate_line_impl, HAVE_NUMBA
+    if HAVE_NUMBA:
+        try:
+            from numba import njit
+        except ImportError:
+            HAVE_NUMBA = False
+        else:
+            _simulate_line_impl = njit(cache=True)(simulate_line_py)
+            return
+    _simulate_line_impl = simulate_line_lists
+
+def numba_enabled() -> bool:
+    """Whether simulate_line runs JIT-compiled (imports Numba if needed)"""
+    if _simulate_line_impl is None:
+        _load_simulate_line()
+    return HAVE_NUMBA
+
+def simulate_line(*args):
+    """simulate_line_py, JIT-compiled with Numba when it is available"""
+    if _simulate_line_impl is None:
+        _load_simulate_line()
+    return _simulate_line_impl(*args)
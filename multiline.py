@@ -0,0 +1,405 @@
+"""Many copies of the production line, optionally sharing resources, in one net.
+
+MultiLineProductionSimulation instantiates N parameterized replicas of the
+StochasticProductionSimulation line in a single PetriNet. Places listed in
+`shared` (the tool and/or the robots) exist once and are contended for by all
+lines: the operation a shared resource performs (work for the tool, process1
+and process2 for the robots) can only happen for one line at a time. The
+time-stepped engines visit every transition every second, which
+costs O(N) per second of simulated time; EventDrivenEngine instead only
+touches transitions whose timer expires or whose input places change, so the
+cost per firing stays roughly constant as N grows.
+"""
+import heapq
+from dataclasses import dataclass
+from math import ceil, log
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from petrinet import Arc, CompiledNet, PetriNet, Place, Transition
+from sim import (BUFFER_NAMES, SeedLike, TransitionConfig, add_to_histogram, as_seed_sequence, child_seed,
+                 histogram_percentile, validate_buffer_capacities)
+
+SHAREABLE_RESOURCES = ["tool", "robot1", "robot2"]
+
+# Within one second, transitions are tried in this order (line by line for
+# each kind), the same order as in StochasticProductionSimulation.
+TRANSITION_KINDS = ["tool_occupy", "tool_release", "produce", "work", "process1", "process2"]
+
+@dataclass
+class LineResults:
+    production_rate: float
+    tool_work_rate: float
+    post_processing_rate: float
+    buffer_sizes: Dict[str, int]
+    mean_buffer_levels: Dict[str, float]
+
+@dataclass
+class MultiLineResults:
+    lines: List[LineResults]
+    num_events: float
+
+class MultiLineAggregator:
+    """Folds MultiLineResults into running per-line statistics as
+    replications finish, like sim.MonteCarloAggregator: running sums of the
+    rates and mean buffer levels, and histograms of the per-run buffer maxima
+    for their 95th percentile"""
+
+    def __init__(self, num_lines: int):
+        self.count = 0
+        self._sums = np.zeros((num_lines, 3 + len(BUFFER_NAMES)))
+        self._num_events = 0
+        self._maxima_counts = [{name: np.zeros(0, dtype=np.int64) for name in BUFFER_NAMES}
+                               for _ in range(num_lines)]
+
+    def add(self, results: MultiLineResults) -> None:
+        self.count += 1
+        self._num_events += results.num_events
+        for i, line in enumerate(results.lines):
+            self._sums[i] += [line.production_rate, line.tool_work_rate, line.post_processing_rate] + \
+                [line.mean_buffer_levels[name] for name in BUFFER_NAMES]
+            for name in BUFFER_NAMES:
+                self._maxima_counts[i][name] = add_to_histogram(self._maxima_counts[i][name],
+                                                                line.buffer_sizes[name])
+
+    def result(self) -> MultiLineResults:
+        """Average of the results added so far"""
+        if self.count == 0:
+            raise ValueError("No replications have been added.")
+        lines = []
+        for sums, maxima_counts in zip(self._sums / self.count, self._maxima_counts):
+            lines.append(LineResults(
+                production_rate=sums[0],
+                tool_work_rate=sums[1],
+                post_processing_rate=sums[2],
+                buffer_sizes={
+                    name: int(np.ceil(histogram_percentile(maxima_counts[name], 95))) for name in BUFFER_NAMES
+                },
+                mean_buffer_levels=dict(zip(BUFFER_NAMES, sums[3:]))
+            ))
+        return MultiLineResults(lines=lines, num_events=self._num_events / self.count)
+
+class EventDrivenEngine:
+    """Discrete-event simulation of a CompiledNet on the one-second grid of
+    StochasticProductionSimulation.
+
+    A transition fires at the first whole second at or after its previous
+    firing time plus max(1, N(mean, sd)) at which it is enabled. Transitions
+    are kept in a heap keyed by (second, transition index). A disabled
+    transition is parked on the place that blocks it and re-queued when that
+    place changes, in the same second if it comes later in the firing order
+    and otherwise in the next one.
+
+    Transitions in `occupancy` (index -> (ratio, decay rate)) additionally need
+    a Bernoulli trial with probability ratio / (1 + decay * log(1 + t / 3600))
+    to succeed in every second they are enabled. Rather than drawing one
+    uniform per second, the first success is sampled directly by thinning a
+    geometric distribution.
+
+    Transitions with the same non-negative `cooldown_groups` entry share one
+    cooldown: after any of them fires, none may fire again until the delay
+    has passed. This models several lines handing work to one shared server.
+    Waiting group members are served first come, first served (ties by
+    index), and released one at a time so that a busy group costs O(log N)
+    per firing rather than O(N).
+
+    `gates` (transition index -> place index) marks transitions whose firings
+    are also counted separately when the place held a token at the start of
+    the second, like `work_when_tool_available` in SimulationState.
+    """
+
+    def __init__(self, net: CompiledNet, mean_time: np.ndarray, time_sd: np.ndarray,
+                 occupancy: Dict[int, Tuple[float, float]], gates: Optional[Dict[int, int]] = None,
+                 cooldown_groups: Optional[Sequence[int]] = None):
+        self.net = net
+        self.mean_time = mean_time.tolist()
+        self.time_sd = time_sd.tolist()
+        self.occupancy = occupancy
+        self.gates = gates or {}
+        num_transitions = len(net.transition_names)
+        self.cooldown_groups = [-1] * num_transitions if cooldown_groups is None else list(cooldown_groups)
+        self.num_groups = max(self.cooldown_groups, default=-1) + 1
+        self.inputs = [list(zip(net.pre_place[net.pre_ptr[t]:net.pre_ptr[t + 1]].tolist(),
+                                net.pre_cost[net.pre_ptr[t]:net.pre_ptr[t + 1]].tolist()))
+                       for t in range(num_transitions)]
+        self.outputs = [list(zip(net.post_place[net.post_ptr[t]:net.post_ptr[t + 1]].tolist(),
+                                 net.post_cost[net.post_ptr[t]:net.post_ptr[t + 1]].tolist()))
+                        for t in range(num_transitions)]
+        # Net token change of every place a transition touches
+        self.deltas = []
+        for t in range(num_transitions):
+            delta = {}
+            for place, cost in self.inputs[t]:
+                delta[place] = delta.get(place, 0) - cost
+            for place, cost in self.outputs[t]:
+                delta[place] = delta.get(place, 0) + cost
+            self.deltas.append([(place, change) for place, change in delta.items() if change != 0])
+
+    def _blocking_place(self, marking, capacity, t):
+        """(place, needs_room) of the first place preventing `t` from firing, or None"""
+        for place, cost in self.inputs[t]:
+            if marking[place] < cost:
+                return place, False
+        for place, change in self.deltas[t]:
+            if change > 0 and capacity[place] >= 0 and marking[place] + change > capacity[place]:
+                return place, True
+        return None
+
+    def _first_success(self, t, step, last_step, rng):
+        """First second in [step, last_step] whose Bernoulli trial succeeds, or None"""
+        ratio, decay = self.occupancy[t]
+
+        def prob(second):
+            return ratio * (1 / (1 + decay * log(1 + second / 3600)))
+
+        # prob is monotone in time, so its maximum over the horizon is at an end
+        p_max = min(1.0, max(prob(step), prob(last_step)))
+        if p_max <= 0:
+            return None
+        second = step - 1
+        while True:
+            second += int(rng.geometric(p_max))
+            if second > last_step:
+                return None
+            if rng.random() * p_max < prob(second):
+                return second
+
+    def run(self, num_steps: int, rng: np.random.Generator):
+        """Simulate seconds 0 .. num_steps - 1 from the net's initial marking.
+
+        Returns (firings per transition, gated firings per transition, maximum
+        level per place, mean level per place), where levels are observed at
+        the start of every second as in SimulationState.buffer_levels.
+        """
+        marking = self.net.marking.tolist()
+        capacity = self.net.capacity.tolist()
+        num_places = len(marking)
+        num_transitions = len(self.inputs)
+        last_step = num_steps - 1
+
+        fired = [0] * num_transitions
+        gated = [0] * num_transitions
+        level_max = list(marking)
+        level_area = [0] * num_places
+        level_since = [0] * num_places
+        changed = {}  # place -> level at the start of the current second
+        waiting_for_tokens = [[] for _ in range(num_places)]
+        waiting_for_room = [[] for _ in range(num_places)]
+        presampled = [-1] * num_transitions
+        group_due = [0] * self.num_groups
+        group_waiting = [[] for _ in range(self.num_groups)]  # heaps of (ready step, transition)
+
+        normals = rng.standard_normal(1024)
+        next_normal = 0
+        heap = [(0, t) for t in range(num_transitions)]
+        heapq.heapify(heap)
+        current_step = 0
+
+        while heap:
+            step, t = heapq.heappop(heap)
+            if step != current_step:
+                # Levels at the start of `step` are final for all places changed before it
+                for place in changed:
+                    level_max[place] = max(level_max[place], marking[place])
+                changed.clear()
+                current_step = step
+
+            if t < 0:
+                # Cooldown of group -1 - t is over: let its first waiting member try
+                waiting = group_waiting[-1 - t]
+                if waiting:
+                    heapq.heappush(heap, (step, heapq.heappop(waiting)[1]))
+                continue
+            group = self.cooldown_groups[t]
+            if group >= 0 and step < group_due[group]:
+                heapq.heappush(group_waiting[group], (step, t))
+                continue
+
+            blocked = self._blocking_place(marking, capacity, t)
+            if blocked is not None:
+                place, needs_room = blocked
+                (waiting_for_room if needs_room else waiting_for_tokens)[place].append(t)
+                presampled[t] = -1
+                if group >= 0 and group_waiting[group]:
+                    # The group is idle, so pass the turn to its next waiting member
+                    waiter = heapq.heappop(group_waiting[group])[1]
+                    wake_step = step if waiter > t else step + 1
+                    if wake_step <= last_step:
+                        heapq.heappush(heap, (wake_step, waiter))
+                continue
+            if t in self.occupancy and presampled[t] != step:
+                success = self._first_success(t, step, last_step, rng)
+                if success is None:
+                    continue
+                if success > step:
+                    presampled[t] = success
+                    heapq.heappush(heap, (success, t))
+                    continue
+            presampled[t] = -1
+
+            fired[t] += 1
+            if t in self.gates and changed.get(self.gates[t], marking[self.gates[t]]) >= 1:
+                gated[t] += 1
+            for place, change in self.deltas[t]:
+                level_area[place] += marking[place] * (step + 1 - level_since[place])
+                level_since[place] = step + 1
+                changed.setdefault(place, marking[place])
+                marking[place] += change
+                waiters = waiting_for_tokens[place] if change > 0 else waiting_for_room[place]
+                for waiter in waiters:
+                    wake_step = step if waiter > t else step + 1
+                    if wake_step <= last_step:
+                        heapq.heappush(heap, (wake_step, waiter))
+                waiters.clear()
+
+            if next_normal == len(normals):
+                normals = rng.standard_normal(1024)
+                next_normal = 0
+            delay = max(1.0, self.mean_time[t] + self.time_sd[t] * normals[next_normal])
+            next_normal += 1
+            due = ceil(step + delay)
+            if group >= 0:
+                group_due[group] = due
+                heapq.heappush(group_waiting[group], (due, t))
+                if due <= last_step:
+                    heapq.heappush(heap, (due, -1 - group))
+            elif due <= last_step:
+                heapq.heappush(heap, (due, t))
+
+        if current_step < last_step:
+            for place in changed:
+                level_max[place] = max(level_max[place], marking[place])
+        for place in range(num_places):
+            level_area[place] += marking[place] * (num_steps - level_since[place])
+        level_mean = [area / num_steps for area in level_area]
+        return fired, gated, level_max, level_mean
+
+class MultiLineProductionSimulation:
+    def __init__(self, transition_configs: Union[TransitionConfig, Sequence[TransitionConfig]],
+                 num_lines: Optional[int] = None, shared: Sequence[str] = (),
+                 simulation_duration: float = 3600.0, seed: SeedLike = None,
+                 buffer_capacities: Optional[Dict[str, Optional[int]]] = None):
+        """`transition_configs` is one config for all lines (then `num_lines` is
+        required) or one config per line. A shared tool is occupied and
+        released with the parameters of the first line."""
+        if isinstance(transition_configs, TransitionConfig):
+            if num_lines is None:
+                raise ValueError("num_lines is required when a single TransitionConfig is given.")
+            transition_configs = [transition_configs] * num_lines
+        self.transition_configs = list(transition_configs)
+        self.num_lines = len(self.transition_configs)
+        if num_lines is not None and num_lines != self.num_lines:
+            raise ValueError(f"num_lines={num_lines} does not match {self.num_lines} transition configs.")
+        unknown = set(shared) - set(SHAREABLE_RESOURCES)
+        if unknown:
+            raise ValueError(f"Cannot share {sorted(unknown)}, expected names from {SHAREABLE_RESOURCES}.")
+        self.shared = list(shared)
+        self.simulation_duration = simulation_duration
+        self.num_steps = int(np.floor(simulation_duration)) + 1
+        self.seed_sequence = as_seed_sequence(seed)
+
+        self.petri_net = self._build_net(validate_buffer_capacities(buffer_capacities or {}))
+        self.compiled_net = self.petri_net.compile()
+
+        mean_time, time_sd, occupancy, gates = [], [], {}, {}
+        # A shared resource serves one line at a time, so the operation it
+        # performs has one cooldown across lines
+        served_by = {"work": "tool", "process1": "robot1", "process2": "robot2"}
+        group_ids = {resource: g for g, resource in enumerate(self.shared)}
+        cooldown_groups = []
+        for i, transition in enumerate(self.petri_net.transitions):
+            line, kind = self._transition_lines[i]
+            config = self.transition_configs[line]
+            params = getattr(config, kind)
+            mean_time.append(params.mean_time)
+            time_sd.append(params.time_sd)
+            if kind == "tool_occupy":
+                occupancy[i] = (config.tool_occupied_ratio, config.tool_occupied_ratio_decay_rate)
+            if kind == "work":
+                gates[i] = self.compiled_net.place_index(self.place_name(line, "tool"))
+            cooldown_groups.append(group_ids.get(served_by.get(kind), -1))
+        self.engine = EventDrivenEngine(self.compiled_net, np.array(mean_time), np.array(time_sd),
+                                        occupancy, gates, cooldown_groups)
+
+    def place_name(self, line: int, name: str) -> str:
+        return name if name in self.shared else f"line{line}.{name}"
+
+    def _build_net(self, buffer_capacities) -> PetriNet:
+        places = {}
+
+        def place(line, name, tokens):
+            full_name = self.place_name(line, name)
+            if full_name not in places:
+                capacity = buffer_capacities.get(name) if name in BUFFER_NAMES else None
+                places[full_name] = Place(full_name, tokens, capacity)
+            return places[full_name]
+
+        def line_transitions(i):
+            production, buffer1 = place(i, "production", 1), place(i, "buffer1", 0)
+            buffer2, buffer3 = place(i, "buffer2", 0), place(i, "buffer3", 0)
+            tool, tool_occupied = place(i, "tool", 1), place(i, "tool_occupied", 0)
+            robot1, robot2 = place(i, "robot1", 1), place(i, "robot2", 1)
+            return {
+                "tool_occupy": ([Arc(tool, 1)], [Arc(tool_occupied, 1)]),
+                "tool_release": ([Arc(tool_occupied, 1)], [Arc(tool, 1)]),
+                "produce": ([Arc(production, 1)], [Arc(production, 1), Arc(buffer1, 1)]),
+                "work": ([Arc(buffer1, 1), Arc(tool, 1)], [Arc(tool, 1), Arc(buffer2, 1), Arc(buffer3, 1)]),
+                "process1": ([Arc(buffer2, 1), Arc(robot1, 1)], [Arc(robot1, 1)]),
+                "process2": ([Arc(buffer3, 1), Arc(robot2, 1)], [Arc(robot2, 1)]),
+            }
+
+        arcs_by_line = [line_transitions(i) for i in range(self.num_lines)]
+        transitions = []
+        self._transition_lines = []
+        for kind in TRANSITION_KINDS:
+            # A shared tool is occupied and released once, not once per line
+            lines = [0] if kind in ("tool_occupy", "tool_release") and "tool" in self.shared \
+                else range(self.num_lines)
+            for i in lines:
+                input_arcs, output_arcs = arcs_by_line[i][kind]
+                name = kind if len(lines) == 1 and self.num_lines > 1 else f"line{i}.{kind}"
+                transitions.append(Transition(name, input_arcs, output_arcs))
+                self._transition_lines.append((i, kind))
+
+        return PetriNet(
+            name="MultiLineProduction",
+            places=list(places.values()),
+            arcs=[arc for t in transitions for arc in t.input_arcs + t.output_arcs],
+            transitions=transitions
+        )
+
+    def run_single_simulation(self, seed: SeedLike = None) -> MultiLineResults:
+        """Simulate all lines once with the event-driven engine"""
+        seed_seq = self.seed_sequence.spawn(1)[0] if seed is None else as_seed_sequence(seed)
+        fired, gated, level_max, level_mean = self.engine.run(self.num_steps, np.random.default_rng(seed_seq))
+        hours = self.simulation_duration / 3600
+
+        counts = [{} for _ in range(self.num_lines)]
+        work_when_tool_available = [0] * self.num_lines
+        for (line, kind), count, gated_count in zip(self._transition_lines, fired, gated):
+            counts[line][kind] = count
+            if kind == "work":
+                work_when_tool_available[line] = gated_count
+        lines = []
+        for i in range(self.num_lines):
+            buffers = [self.compiled_net.place_index(self.place_name(i, name)) for name in BUFFER_NAMES]
+            lines.append(LineResults(
+                production_rate=counts[i]["produce"] / hours,
+                tool_work_rate=work_when_tool_available[i] / hours,
+                post_processing_rate=(counts[i]["process1"] + counts[i]["process2"]) / hours,
+                buffer_sizes={name: level_max[p] for name, p in zip(BUFFER_NAMES, buffers)},
+                mean_buffer_levels={name: level_mean[p] for name, p in zip(BUFFER_NAMES, buffers)}
+            ))
+        return MultiLineResults(lines=lines, num_events=sum(fired))
+
+    def run_monte_carlo(self, num_simulations: int = 100, seed: SeedLike = None) -> MultiLineResults:
+        """Run multiple simulations and average results per line; buffer sizes
+        are the 95th percentile of the per-run maxima, as in
+        StochasticProductionSimulation.run_monte_carlo. Each run is folded into
+        a MultiLineAggregator as soon as it finishes."""
+        batch_seed = self.seed_sequence.spawn(1)[0] if seed is None else as_seed_sequence(seed)
+        aggregator = MultiLineAggregator(self.num_lines)
+        for i in range(num_simulations):
+            aggregator.add(self.run_single_simulation(seed=child_seed(batch_seed, i)))
+        return aggregator.result()
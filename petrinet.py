@@ -1,11 +1,12 @@
 from dataclasses import dataclass, field
-from typing import List
-import graphviz
+from typing import List, Optional
+import numpy as np
 
 @dataclass
 class Place:
     name: str
     tokens: int
+    capacity: Optional[int] = None  # None means unbounded
 
 @dataclass
 class Arc:
@@ -22,6 +23,13 @@ class Transition:
         for arc in self.input_arcs:
             if arc.place.tokens < arc.cost:
                 return False
+        # Blocking before service: a transition may not fire if it would overfill an output place
+        for arc in self.output_arcs:
+            if arc.place.capacity is not None:
+                consumed = sum(a.cost for a in self.input_arcs if a.place is arc.place)
+                produced = sum(a.cost for a in self.output_arcs if a.place is arc.place)
+                if arc.place.tokens - consumed + produced > arc.place.capacity:
+                    return False
         return True
 
     def fire(self):
@@ -33,6 +41,32 @@ class Transition:
             return True
         return False
 
+@dataclass
+class CompiledNet:
+    """Numeric form of a PetriNet for array-based simulation kernels.
+
+    Arcs are stored in CSR layout: the input arcs of transition `t` are
+    `pre_place[pre_ptr[t]:pre_ptr[t + 1]]` with costs `pre_cost[...]`, and
+    likewise for output arcs with the `post_*` arrays. `capacity` is -1 for
+    unbounded places.
+    """
+    place_names: List[str]
+    transition_names: List[str]
+    marking: np.ndarray
+    capacity: np.ndarray
+    pre_ptr: np.ndarray
+    pre_place: np.ndarray
+    pre_cost: np.ndarray
+    post_ptr: np.ndarray
+    post_place: np.ndarray
+    post_cost: np.ndarray
+
+    def place_index(self, name):
+        return self.place_names.index(name)
+
+    def transition_index(self, name):
+        return self.transition_names.index(name)
+
 @dataclass
 class PetriNet:
     name: str
@@ -60,7 +94,45 @@ class PetriNet:
                 return place
         raise ValueError(f"Place '{name}' not found")
 
+    def marking(self):
+        return np.array([place.tokens for place in self.places], dtype=np.int64)
+
+    def set_marking(self, marking):
+        for place, tokens in zip(self.places, marking):
+            place.tokens = int(tokens)
+
+    def compile(self):
+        """Compile the net into integer arrays (see CompiledNet)"""
+        index = {place.name: i for i, place in enumerate(self.places)}
+
+        def csr(arc_lists):
+            ptr = np.zeros(len(arc_lists) + 1, dtype=np.int64)
+            ptr[1:] = np.cumsum([len(arcs) for arcs in arc_lists])
+            places = np.array([index[arc.place.name] for arcs in arc_lists for arc in arcs], dtype=np.int64)
+            costs = np.array([arc.cost for arcs in arc_lists for arc in arcs], dtype=np.int64)
+            return ptr, places, costs
+
+        pre_ptr, pre_place, pre_cost = csr([t.input_arcs for t in self.transitions])
+        post_ptr, post_place, post_cost = csr([t.output_arcs for t in self.transitions])
+        return CompiledNet(
+            place_names=[place.name for place in self.places],
+            transition_names=[transition.name for transition in self.transitions],
+            marking=self.marking(),
+            capacity=np.array([-1 if place.capacity is None else place.capacity for place in self.places],
+                              dtype=np.int64),
+            pre_ptr=pre_ptr,
+            pre_place=pre_place,
+            pre_cost=pre_cost,
+            post_ptr=post_ptr,
+            post_place=post_place,
+            post_cost=post_cost
+        )
+
     def visualize(self):
+        # graphviz is only needed for rendering, so keep it out of the import path
+        # of the simulation core (process-pool workers never draw the net).
+        import graphviz
+
         g = graphviz.Digraph(format='png')
 
         for place in self.places:
@@ -0,0 +1,260 @@
+"""Global sensitivity analysis of the simulation outputs to the TransitionConfig parameters.
+
+gridsearch.py varies a few parameters on a Cartesian grid, which shows local
+trends but not which of the 14 parameters actually drive the outputs. This
+module provides
+- Sobol indices from a Saltelli design: N * (d + 2) evaluations give first
+  order and total indices for all d parameters and every output at once, and
+  bootstrap confidence intervals are computed by resampling the same
+  evaluations;
+- Morris elementary effects: r * (d + 1) evaluations, a cheaper screening
+  that ranks parameters without variance decomposition.
+
+Design points are evaluated in batches on a process pool. All points share
+the same Monte Carlo seed (common random numbers), so differences between
+points come from the parameters rather than from sampling noise.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sim import (TransitionConfig, TransitionParams, StochasticProductionSimulation, BUFFER_NAMES, SeedLike,
+                 as_seed_sequence, child_seed)
+
+TRANSITIONS = ["produce", "work", "process1", "process2", "tool_occupy", "tool_release"]
+PARAMETER_NAMES = [f"{t}.{field}" for t in TRANSITIONS for field in ["mean_time", "time_sd"]] + \
+    ["tool_occupied_ratio", "tool_occupied_ratio_decay_rate"]
+OUTPUT_NAMES = ["production_rate", "post_processing_rate"] + [f"{name}_size" for name in BUFFER_NAMES]
+
+Bounds = Dict[str, Tuple[float, float]]
+
+@dataclass
+class SobolIndices:
+    parameters: List[str]
+    outputs: List[str]
+    first_order: np.ndarray  # (outputs, parameters)
+    total_order: np.ndarray
+    first_order_ci: np.ndarray  # (outputs, parameters, 2)
+    total_order_ci: np.ndarray
+
+@dataclass
+class MorrisDesign:
+    points: np.ndarray  # (trajectories * (parameters + 1), parameters)
+    order: np.ndarray  # (trajectories, parameters): parameter moved at each step
+    steps: np.ndarray  # (trajectories, parameters): signed step, in units of the parameter range
+
+@dataclass
+class MorrisIndices:
+    parameters: List[str]
+    outputs: List[str]
+    mu_star: np.ndarray  # (outputs, parameters), in output units per parameter range
+    sigma: np.ndarray
+
+def config_to_vector(config: TransitionConfig) -> np.ndarray:
+    values = []
+    for t in TRANSITIONS:
+        params = getattr(config, t)
+        values += [params.mean_time, params.time_sd]
+    return np.array(values + [config.tool_occupied_ratio, config.tool_occupied_ratio_decay_rate])
+
+def vector_to_config(values) -> TransitionConfig:
+    params = {t: TransitionParams(float(values[2 * i]), float(values[2 * i + 1])) for i, t in enumerate(TRANSITIONS)}
+    return TransitionConfig(
+        **params,
+        tool_occupied_ratio=float(values[-2]),
+        tool_occupied_ratio_decay_rate=float(values[-1])
+    )
+
+def default_bounds(config: TransitionConfig, spread: float = 0.25) -> Bounds:
+    """Every parameter of `config` varied by +-`spread` (relative), with the
+    tool occupied ratio capped at 1"""
+    bounds = {name: (value * (1 - spread), value * (1 + spread))
+              for name, value in zip(PARAMETER_NAMES, config_to_vector(config))}
+    low, high = bounds["tool_occupied_ratio"]
+    bounds["tool_occupied_ratio"] = (low, min(high, 1.0))
+    return bounds
+
+def _scale(unit_points: np.ndarray, bounds: Bounds) -> np.ndarray:
+    low = np.array([bounds[name][0] for name in PARAMETER_NAMES])
+    high = np.array([bounds[name][1] for name in PARAMETER_NAMES])
+    return low + unit_points * (high - low)
+
+def saltelli_design(bounds: Bounds, num_samples: int, seed: SeedLike = None) -> np.ndarray:
+    """Points [A; B; AB_1; ...; AB_d], each block `num_samples` rows, where A
+    and B are independent uniform samples and AB_i is A with column i taken
+    from B"""
+    rng = np.random.default_rng(seed)
+    d = len(PARAMETER_NAMES)
+    a = rng.random((num_samples, d))
+    b = rng.random((num_samples, d))
+    blocks = [a, b]
+    for i in range(d):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    return _scale(np.vstack(blocks), bounds)
+
+def _sobol_estimates(y_a, y_b, y_ab):
+    """Saltelli (2010) first order and Jansen total indices for one output;
+    `y_ab` has one column per parameter"""
+    variance = np.var(np.concatenate([y_a, y_b]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first = np.mean(y_b[:, None] * (y_ab - y_a[:, None]), axis=0) / variance
+        total = 0.5 * np.mean((y_a[:, None] - y_ab) ** 2, axis=0) / variance
+    return first, total
+
+def sobol_indices(outputs: np.ndarray, num_bootstrap: int = 200, confidence: float = 0.95,
+                  seed: SeedLike = None, output_names: Optional[List[str]] = None) -> SobolIndices:
+    """Sobol indices from the outputs at the points of `saltelli_design`.
+
+    `outputs` has one row per design point and one column per output.
+    Confidence intervals are bootstrap percentiles over resampled rows of the
+    design, so they need no further evaluations.
+    """
+    outputs = np.asarray(outputs, dtype=np.float64)
+    if outputs.ndim == 1:
+        outputs = outputs[:, None]
+    d = len(PARAMETER_NAMES)
+    num_samples = len(outputs) // (d + 2)
+    if num_samples * (d + 2) != len(outputs):
+        raise ValueError(f"Expected a multiple of {d + 2} rows (a Saltelli design), got {len(outputs)}.")
+    blocks = outputs.reshape(d + 2, num_samples, -1)
+    rng = np.random.default_rng(seed)
+    resamples = rng.integers(num_samples, size=(num_bootstrap, num_samples))
+    alpha = (1 - confidence) / 2
+
+    first, total, first_ci, total_ci = [], [], [], []
+    for k in range(outputs.shape[1]):
+        y_a, y_b, y_ab = blocks[0, :, k], blocks[1, :, k], blocks[2:, :, k].T
+        s1, st = _sobol_estimates(y_a, y_b, y_ab)
+        boot = [_sobol_estimates(y_a[rows], y_b[rows], y_ab[rows]) for rows in resamples]
+        boot_first = np.array([b[0] for b in boot])
+        boot_total = np.array([b[1] for b in boot])
+        first.append(s1)
+        total.append(st)
+        first_ci.append(np.nanquantile(boot_first, [alpha, 1 - alpha], axis=0).T)
+        total_ci.append(np.nanquantile(boot_total, [alpha, 1 - alpha], axis=0).T)
+
+    return SobolIndices(
+        parameters=list(PARAMETER_NAMES),
+        outputs=output_names or OUTPUT_NAMES[:outputs.shape[1]],
+        first_order=np.array(first),
+        total_order=np.array(total),
+        first_order_ci=np.array(first_ci),
+        total_order_ci=np.array(total_ci)
+    )
+
+def morris_design(bounds: Bounds, num_trajectories: int, num_levels: int = 4,
+                  seed: SeedLike = None) -> MorrisDesign:
+    """One-at-a-time trajectories on a `num_levels` grid (Morris 1991). Each
+    trajectory starts at a random grid point and moves every parameter once,
+    in random order, by +-delta with delta = num_levels / (2 * (num_levels - 1))"""
+    rng = np.random.default_rng(seed)
+    d = len(PARAMETER_NAMES)
+    delta = num_levels / (2 * (num_levels - 1))
+    points = np.empty((num_trajectories * (d + 1), d))
+    order = np.empty((num_trajectories, d), dtype=np.int64)
+    steps = np.empty((num_trajectories, d))
+    for r in range(num_trajectories):
+        x = rng.integers(num_levels, size=d) / (num_levels - 1)
+        order[r] = rng.permutation(d)
+        points[r * (d + 1)] = x
+        for j, i in enumerate(order[r]):
+            step = delta if x[i] + delta <= 1 else -delta
+            x = x.copy()
+            x[i] += step
+            steps[r, j] = step
+            points[r * (d + 1) + j + 1] = x
+    return MorrisDesign(points=_scale(points, bounds), order=order, steps=steps)
+
+def morris_indices(design: MorrisDesign, outputs: np.ndarray,
+                   output_names: Optional[List[str]] = None) -> MorrisIndices:
+    """mu* (mean absolute elementary effect) and sigma (standard deviation of
+    the elementary effects) from the outputs at `design.points`"""
+    outputs = np.asarray(outputs, dtype=np.float64)
+    if outputs.ndim == 1:
+        outputs = outputs[:, None]
+    num_trajectories, d = design.order.shape
+    trajectories = outputs.reshape(num_trajectories, d + 1, -1)
+    effects = np.empty((num_trajectories, d, outputs.shape[1]))
+    for r in range(num_trajectories):
+        changes = np.diff(trajectories[r], axis=0) / design.steps[r][:, None]
+        effects[r, design.order[r]] = changes
+    return MorrisIndices(
+        parameters=list(PARAMETER_NAMES),
+        outputs=output_names or OUTPUT_NAMES[:outputs.shape[1]],
+        mu_star=np.abs(effects).mean(axis=0).T,
+        sigma=effects.std(axis=0, ddof=1).T if num_trajectories > 1 else np.zeros((outputs.shape[1], d))
+    )
+
+def _evaluate_batch(args) -> np.ndarray:
+    points, num_simulations, simulation_duration, seed, engine = args
+    rows = []
+    for values in points:
+        sim = StochasticProductionSimulation(vector_to_config(values), simulation_duration=simulation_duration,
+                                             engine=engine)
+        results = sim.run_monte_carlo(num_simulations=num_simulations, seed=seed, keep_traces=False)
+        rows.append([results.production_rate, results.post_processing_rate] +
+                    [results.buffer_sizes[name] for name in BUFFER_NAMES])
+    return np.array(rows, dtype=np.float64).reshape(len(points), len(OUTPUT_NAMES))
+
+def evaluate_design(points: np.ndarray, num_simulations: int = 20, simulation_duration: float = 3600.0 * 8,
+                    seed: SeedLike = 0, engine: str = "kernel", max_workers: Optional[int] = None,
+                    batch_size: int = 16) -> np.ndarray:
+    """Outputs (OUTPUT_NAMES columns) of a Monte Carlo batch at every design point.
+
+    Every point is simulated with the same batch seed, resolved from `seed`
+    once. Points are split into batches of `batch_size` and evaluated on a
+    process pool with `max_workers` workers (in this process if `max_workers`
+    is 1).
+    """
+    seed = as_seed_sequence(seed)
+    batches = [(points[i:i + batch_size], num_simulations, simulation_duration, seed, engine)
+               for i in range(0, len(points), batch_size)]
+    if max_workers == 1:
+        results = [_evaluate_batch(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_evaluate_batch, batches))
+    return np.vstack(results)
+
+def run_sobol_analysis(config: TransitionConfig, bounds: Optional[Bounds] = None, num_samples: int = 64,
+                       seed: SeedLike = 0, **evaluate_kwargs) -> SobolIndices:
+    """Sobol indices of all outputs around `config`, using
+    num_samples * (len(PARAMETER_NAMES) + 2) Monte Carlo batches. The design,
+    the simulations and the bootstrap use children 0, 1 and 2 of `seed`."""
+    seed_seq = as_seed_sequence(seed)
+    points = saltelli_design(bounds or default_bounds(config), num_samples, seed=child_seed(seed_seq, 0))
+    outputs = evaluate_design(points, seed=child_seed(seed_seq, 1), **evaluate_kwargs)
+    return sobol_indices(outputs, seed=child_seed(seed_seq, 2))
+
+def run_morris_analysis(config: TransitionConfig, bounds: Optional[Bounds] = None, num_trajectories: int = 10,
+                        seed: SeedLike = 0, **evaluate_kwargs) -> MorrisIndices:
+    """Morris screening of all outputs around `config`, using
+    num_trajectories * (len(PARAMETER_NAMES) + 1) Monte Carlo batches. The
+    design and the simulations use children 0 and 1 of `seed`."""
+    seed_seq = as_seed_sequence(seed)
+    design = morris_design(bounds or default_bounds(config), num_trajectories, seed=child_seed(seed_seq, 0))
+    outputs = evaluate_design(design.points, seed=child_seed(seed_seq, 1), **evaluate_kwargs)
+    return morris_indices(design, outputs)
+
+if __name__ == "__main__":
+    base_config = TransitionConfig(
+        produce=TransitionParams(40.0, 5.0),
+        work=TransitionParams(20.0, 10.0),
+        process1=TransitionParams(30.0, 10.0),
+        process2=TransitionParams(30.0, 10.0),
+        tool_occupy=TransitionParams(5.0, 0.0),
+        tool_release=TransitionParams(50.0, 20.0),
+        tool_occupied_ratio=0.15,
+        tool_occupied_ratio_decay_rate=0.8
+    )
+    indices = run_sobol_analysis(base_config, num_samples=32, num_simulations=10)
+    for k, output in enumerate(indices.outputs):
+        print(f"\n{output}:")
+        for i in np.argsort(-indices.total_order[k]):
+            low, high = indices.total_order_ci[k, i]
+            print(f"  {indices.parameters[i]:<32} S1={indices.first_order[k, i]:6.3f}  "
+                  f"ST={indices.total_order[k, i]:6.3f}  [{low:6.3f}, {high:6.3f}]")
@@ -1,10 +1,8 @@
 from petrinet import *
+from kernel import simulate_line
 import numpy as np
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 @dataclass
 class TransitionParams:
@@ -43,8 +41,219 @@ class SimulationResults:
     buffer_sizes: Dict[str, int]
     buffer_levels: Dict[str, List[int]]
 
+@dataclass
+class SimulationSummary:
+    event_counts: Dict[str, int]  # keyed by SimulationEvent.type
+    work_when_tool_available: int
+    tool_unavailable_time: int  # seconds
+    buffer_maxima: Dict[str, int]
+
+@dataclass
+class KernelRun:
+    """State and output of one copy of the line in kernel.simulate_line
+    (see StochasticProductionSimulation.run_kernel_batch)"""
+    marking: np.ndarray
+    next_fire: np.ndarray
+    fired: np.ndarray
+    buffer_max: np.ndarray
+    tool_unavailable_time: int
+    work_when_tool_available: int
+    stop_step: int
+    buffer_levels: np.ndarray  # (buffers, steps), empty unless recorded
+    tool_state: np.ndarray
+    event_step: np.ndarray
+    event_transition: np.ndarray
+
+BUFFER_NAMES = ["buffer1", "buffer2", "buffer3"]
+ENGINES = ["reference", "kernel"]
+
+SeedLike = Union[None, int, np.random.SeedSequence, np.random.Generator]
+
+def as_seed_sequence(seed: SeedLike) -> np.random.SeedSequence:
+    """Normalize a seed, SeedSequence or Generator to a SeedSequence.
+
+    A Generator is consumed: it yields a new SeedSequence on every call.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(seed.integers(0, 2**32, size=4).tolist())
+    return np.random.SeedSequence(seed)
+
+def child_seed(seed_seq: np.random.SeedSequence, index: int) -> np.random.SeedSequence:
+    """The `index`-th child of `seed_seq`, as `seed_seq.spawn` would create it,
+    without depending on how many children were spawned before"""
+    return np.random.SeedSequence(seed_seq.entropy, spawn_key=seed_seq.spawn_key + (index,),
+                                  pool_size=seed_seq.pool_size)
+
+class RandomStreams:
+    """Random numbers of one replication, each stream drawn from its own child of `seed_seq`.
+
+    Tool occupation at each second from `start_step` on draws a uniform from
+    child 0. The k-th firing of transition i is delayed by a normal number of
+    standard deviations drawn from child 1 + i, so a transition's delays do
+    not depend on how often the other transitions fire.
+
+    The streams are drawn as the run advances, and only the numbers still
+    ahead of it are kept. `uniforms[step - uniform_start]` and
+    `normals[normal_ptr[i] + k - normal_base[i]]` are the windows read by the
+    kernel, moved on by `advance`; the reference engine reads the streams
+    through `uniform` and `normal`, `block_size` seconds at a time. Since
+    every draw continues its stream's generator, the numbers do not depend
+    on how the streams were split into draws, nor on the `firing_rates`
+    (firings per second) used to size the draws of normals.
+    """
+
+    def __init__(self, seed_seq: np.random.SeedSequence, firing_rates: Sequence[float],
+                 start_step: int = 0, block_size: int = 16384):
+        self.block_size = block_size
+        self._firing_rates = firing_rates
+        self._uniform_generator = np.random.default_rng(child_seed(seed_seq, 0))
+        self._generators = [np.random.default_rng(child_seed(seed_seq, 1 + i))
+                            for i in range(len(firing_rates))]
+        self.uniform_start = start_step
+        self.uniforms = np.empty(0)
+        self.normal_base = np.zeros(len(firing_rates), dtype=np.int64)
+        self._normals = [np.empty(0) for _ in firing_rates]
+        self._pack()
+
+    def _pack(self):
+        self.normal_ptr = np.zeros(len(self._normals) + 1, dtype=np.int64)
+        np.cumsum([len(normals) for normals in self._normals], out=self.normal_ptr[1:])
+        self.normals = np.concatenate(self._normals)
+
+    def _expected_normals(self, transition: int, num_steps: int) -> int:
+        """Normals to draw ahead for `num_steps` seconds of `transition`, with some slack"""
+        return int(1.25 * self._firing_rates[transition] * num_steps) + 16
+
+    def _next_normals(self, transition: int, first: int, size: int) -> None:
+        """Drop the normals of `transition` before the `first`-th and draw `size` more"""
+        normals = self._normals[transition][first - self.normal_base[transition]:]
+        self._normals[transition] = np.concatenate(
+            [normals, self._generators[transition].standard_normal(size)])
+        self.normal_base[transition] = first
+
+    def advance(self, step: int, fired: np.ndarray, num_steps: int) -> None:
+        """Move the windows on for a kernel run resumed at `step`, with the
+        number of firings of each transition so far in `fired` (one row per
+        copy of the line), and top every stream up for the next `num_steps`
+        seconds, so that the kernel is not stopped by each stream in turn"""
+        self.uniforms = self.uniforms[step - self.uniform_start:]
+        self.uniform_start = step
+        if len(self.uniforms) < num_steps:
+            self.uniforms = np.concatenate(
+                [self.uniforms, self._uniform_generator.random(num_steps - len(self.uniforms))])
+        fired = np.atleast_2d(fired)
+        for transition, (first, last) in enumerate(zip(fired.min(axis=0), fired.max(axis=0))):
+            ahead = self.normal_base[transition] + len(self._normals[transition]) - last
+            needed = self._expected_normals(transition, num_steps)
+            if ahead < needed:
+                self._next_normals(transition, first, needed - ahead)
+        self._pack()
+
+    def uniform(self, step: int) -> float:
+        """The uniform deciding tool occupation at `step`; steps are read in order"""
+        while step >= self.uniform_start + len(self.uniforms):
+            self.uniform_start += len(self.uniforms)
+            self.uniforms = self._uniform_generator.random(self.block_size)
+        return self.uniforms[step - self.uniform_start]
+
+    def normal(self, transition: int, k: int) -> float:
+        """The normal delaying the k-th firing of `transition`; firings are read in order"""
+        while k >= self.normal_base[transition] + len(self._normals[transition]):
+            self._next_normals(transition, k, self._expected_normals(transition, self.block_size))
+        return self._normals[transition][k - self.normal_base[transition]]
+
+def validate_buffer_capacities(capacities) -> Dict[str, Optional[int]]:
+    """Buffer capacities given as a dict from buffer name to capacity or a
+    sequence in BUFFER_NAMES order, as a dict over all of BUFFER_NAMES with
+    None for unbounded. Raises ValueError for unknown names and negative
+    capacities."""
+    if not isinstance(capacities, dict):
+        capacities = dict(zip(BUFFER_NAMES, capacities))
+    unknown = set(capacities) - set(BUFFER_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown buffers {sorted(unknown)}, expected names from {BUFFER_NAMES}.")
+    for name in BUFFER_NAMES:
+        capacity = capacities.get(name)
+        if capacity is not None and capacity < 0:
+            raise ValueError(f"Capacity of '{name}' must be non-negative, got {capacity}.")
+    return {name: capacities.get(name) for name in BUFFER_NAMES}
+
+def histogram_percentile(counts: np.ndarray, q: float) -> float:
+    """np.percentile (linear interpolation) of the non-negative integer sample
+    whose value counts are `counts`, i.e. of np.repeat(np.arange(len(counts)), counts)"""
+    cumulative = np.cumsum(counts)
+    rank = (cumulative[-1] - 1) * q / 100
+    lower = int(np.floor(rank))
+    # k-th smallest value: the first value whose cumulative count exceeds k
+    lower_value = int(np.searchsorted(cumulative, lower, side="right"))
+    upper_value = int(np.searchsorted(cumulative, min(lower + 1, cumulative[-1] - 1), side="right"))
+    return lower_value + (rank - lower) * (upper_value - lower_value)
+
+def add_to_histogram(counts: np.ndarray, value: int) -> np.ndarray:
+    """Count one more occurrence of the non-negative integer `value` in
+    `counts`, which is extended if needed; returns the updated counts"""
+    if value >= len(counts):
+        counts = np.pad(counts, (0, value + 1 - len(counts)))
+    counts[value] += 1
+    return counts
+
+class MonteCarloAggregator:
+    """Folds SimulationResults into running statistics as replications finish.
+
+    Scalar metrics are kept as running sums and per-run buffer maxima as
+    integer histograms, so the 95th-percentile buffer sizes need no per-run
+    storage. With `keep_traces`, the per-second buffer levels are summed for
+    the mean trajectory, which takes O(duration) memory; without it the
+    aggregator's memory does not depend on the number of replications or on
+    the duration, and the result has empty `buffer_levels`.
+    """
+
+    def __init__(self, keep_traces: bool = True):
+        self.keep_traces = keep_traces
+        self.count = 0
+        self._sums = np.zeros(5)
+        self._level_sums: Dict[str, np.ndarray] = {}
+        self._maxima_counts = {name: np.zeros(0, dtype=np.int64) for name in BUFFER_NAMES}
+
+    def add(self, result: SimulationResults) -> None:
+        self.count += 1
+        self._sums += [result.production_rate, result.tool_work_rate, result.tool_unavailable_stats[0],
+                       result.tool_unavailable_stats[1], result.post_processing_rate]
+        for name in BUFFER_NAMES:
+            self._maxima_counts[name] = add_to_histogram(self._maxima_counts[name], result.buffer_sizes[name])
+        if self.keep_traces:
+            for name, levels in result.buffer_levels.items():
+                if name in self._level_sums:
+                    self._level_sums[name] += levels
+                else:
+                    self._level_sums[name] = np.array(levels, dtype=np.float64)
+
+    def result(self) -> SimulationResults:
+        """Average of the results added so far"""
+        if self.count == 0:
+            raise ValueError("No replications have been added.")
+        production_rate, tool_work_rate, unavail_freq, unavail_duration, post_processing_rate = \
+            self._sums / self.count
+        return SimulationResults(
+            production_rate=production_rate,
+            tool_work_rate=tool_work_rate,
+            tool_unavailable_stats=(unavail_freq, unavail_duration),
+            post_processing_rate=post_processing_rate,
+            buffer_sizes={
+                name: int(np.ceil(histogram_percentile(self._maxima_counts[name], 95)))
+                for name in BUFFER_NAMES
+            },
+            buffer_levels={name: total / self.count for name, total in self._level_sums.items()}
+        )
+
 class StochasticProductionSimulation:
-    def __init__(self, transition_config: TransitionConfig, simulation_duration: float = 3600.0):
+    def __init__(self, transition_config: TransitionConfig, simulation_duration: float = 3600.0,
+                 engine: str = "reference", seed: SeedLike = None,
+                 buffer_capacities: Optional[Dict[str, Optional[int]]] = None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}.")
         self.production = Place("production", 1)
         self.buffer1 = Place("buffer1", 0)
         self.tool = Place("tool", 1)
@@ -100,36 +309,120 @@ class StochasticProductionSimulation:
         self.tool_occupied_ratio = transition_config.tool_occupied_ratio
         self.tool_occupied_decay_rate = transition_config.tool_occupied_ratio_decay_rate
         self.simulation_duration = simulation_duration
+        self.engine = engine
+
+        # Root of all randomness: every run without an explicit seed spawns a fresh child
+        self.seed_sequence = as_seed_sequence(seed)
+        self.last_batch_seed: Optional[np.random.SeedSequence] = None
+        # Validated capacity vectors of the most recent batch if it was a sweep
+        self.last_sweep_capacities: Optional[List[Dict[str, Optional[int]]]] = None
+
+        # Numeric form of the net shared by the random stream layout and the kernel
+        self.compiled_net = self.petri_net.compile()
+        self.num_steps = int(np.floor(simulation_duration)) + 1
+        self._transition_index = {name: i for i, name in enumerate(self.compiled_net.transition_names)}
+        self._mean_time = np.array([self.transition_params[name].mean_time
+                                    for name in self.compiled_net.transition_names])
+        self._time_sd = np.array([self.transition_params[name].time_sd
+                                  for name in self.compiled_net.transition_names])
+        # Delays average at least max(1, mean), which bounds the firings per
+        # second until a full kernel run has counted them
+        self._firing_rate = 1 / np.maximum(1.0, self._mean_time)
+        times = np.arange(self.num_steps, dtype=np.float64)
+        self.occupy_prob = self.tool_occupied_ratio * (1 / (1 + self.tool_occupied_decay_rate*np.log(1 + times/3600)))
+
+        if buffer_capacities is not None:
+            self.set_buffer_capacities(buffer_capacities)
+
+    def buffer_capacities(self) -> Dict[str, Optional[int]]:
+        return {name: self.petri_net.find_place(name).capacity for name in BUFFER_NAMES}
+
+    def set_buffer_capacities(self, capacities) -> None:
+        """Bound the buffers, given a dict from buffer name to capacity or a
+        sequence of capacities in BUFFER_NAMES order. None (or a missing name)
+        means unbounded."""
+        for name, capacity in validate_buffer_capacities(capacities).items():
+            self.petri_net.find_place(name).capacity = capacity
+            self.compiled_net.capacity[self.compiled_net.place_index(name)] = -1 if capacity is None else capacity
+
+    def _capacity_row(self, capacities) -> np.ndarray:
+        """Per-place capacities of the compiled net with the buffers bounded as in `capacities`"""
+        row = self.compiled_net.capacity.copy()
+        for name, capacity in validate_buffer_capacities(capacities).items():
+            row[self.compiled_net.place_index(name)] = -1 if capacity is None else capacity
+        return row
+
+    def random_streams(self, seed_seq: np.random.SeedSequence, start_step: int = 0) -> RandomStreams:
+        """The random numbers of one replication seeded with `seed_seq`, from
+        `start_step` on"""
+        return RandomStreams(seed_seq, self._firing_rate, start_step)
+
+    def reset(self):
+        """Restore the initial marking"""
+        self.petri_net.set_marking(self.compiled_net.marking)
+
+    def _delay(self, name: str, streams: RandomStreams, k: int) -> float:
+        """Delay after the k-th firing of transition `name`"""
+        params = self.transition_params[name]
+        return max(1.0, params.mean_time + params.time_sd * streams.normal(self._transition_index[name], k))
+
+    def run_single_simulation(self, seed: SeedLike = None) -> SimulationState:
+        """Run a single simulation and track events and states.
+
+        The simulation continues from the current marking; call `reset()` first
+        for a fresh run. Without `seed`, a new child of `self.seed_sequence` is used.
+        """
+        seed_seq = self.seed_sequence.spawn(1)[0] if seed is None else as_seed_sequence(seed)
+        return self._simulate(self.random_streams(seed_seq))
+
+    def _simulate(self, streams: RandomStreams) -> SimulationState:
+        """Run the selected engine on pre-drawn random streams"""
+        if self.engine == "kernel":
+            return self._run_kernel_simulation(streams)
+        return self._run_reference(streams, record=True)[0]
 
-    def run_single_simulation(self) -> SimulationState:
-        """Run a single simulation and track events and states"""
+    def _run_reference(self, streams: RandomStreams,
+                       record: bool) -> Tuple[Optional[SimulationState], SimulationSummary]:
+        """Run the reference engine, returning the full state (None unless
+        `record`) and a summary kept up to date as the run goes, so that without
+        `record` memory does not depend on the duration"""
         events = []
         buffer_levels = {"buffer1": [], "buffer2": [], "buffer3": []}
         tool_state = []
         work_when_tool_available = []
+        buffer_maxima = {name: 0 for name in BUFFER_NAMES}
+        work_when_tool_available_count = 0
+        tool_unavailable_time = 0
         
-        # Track when transitions can next fire
+        # Track when transitions can next fire and how often they fired
         next_fire_times = {name: 0.0 for name in self.transition_params}
+        fired = {name: 0 for name in self.transition_params}
         current_time = 0.0
+        step = 0
         
         while current_time <= self.simulation_duration:
             # Record current state
-            buffer_levels["buffer1"].append(self.buffer1.tokens)
-            buffer_levels["buffer2"].append(self.buffer2.tokens)
-            buffer_levels["buffer3"].append(self.buffer3.tokens)
+            for name, place in [("buffer1", self.buffer1), ("buffer2", self.buffer2), ("buffer3", self.buffer3)]:
+                buffer_maxima[name] = max(buffer_maxima[name], place.tokens)
+                if record:
+                    buffer_levels[name].append(place.tokens)
             tool_available = self.tool.tokens == 1
-            tool_state.append(tool_available)
+            if not tool_available:
+                tool_unavailable_time += 1
+            if record:
+                tool_state.append(tool_available)
 
             # Handle tool occupation
-            prob = self.tool_occupied_ratio * (1 / (1 + self.tool_occupied_decay_rate*np.log(1 + current_time/3600)))
             if (self.tool.tokens > 0 and 
                 current_time >= next_fire_times["tool_occupy"] and
-                np.random.random() < prob):
+                streams.uniform(step) < self.occupy_prob[step]):
                 if self.tool_occupy.fire():
-                    events.append(SimulationEvent(current_time, "tool_occupied"))
-                    params = self.transition_params["tool_occupy"]
-                    next_fire_times["tool_occupy"] = current_time + max(1.0, np.random.normal(params.mean_time, params.time_sd))
-                    work_when_tool_available.append(False)
+                    next_fire_times["tool_occupy"] = current_time + self._delay(
+                        "tool_occupy", streams, fired["tool_occupy"])
+                    fired["tool_occupy"] += 1
+                    if record:
+                        events.append(SimulationEvent(current_time, "tool_occupied"))
+                        work_when_tool_available.append(False)
             
             # Process transitions
             for name, transition in [
@@ -142,107 +435,308 @@ class StochasticProductionSimulation:
                 if current_time >= next_fire_times[name]:
                     if transition.is_enabled():
                         if transition.fire():
-                            events.append(SimulationEvent(current_time, name))
-                            params = self.transition_params[name]
-                            next_fire_time = current_time + max(1.0, np.random.normal(params.mean_time, params.time_sd))
-                            next_fire_times[name] = next_fire_time
+                            next_fire_times[name] = current_time + self._delay(name, streams, fired[name])
+                            fired[name] += 1
+                            if record:
+                                events.append(SimulationEvent(current_time, name))
 
                             if name == "work" and tool_available:
-                                work_when_tool_available.append(True)
+                                work_when_tool_available_count += 1
+                                if record:
+                                    work_when_tool_available.append(True)
 
 
 
             current_time += 1.0
+            step += 1
         
+        summary = SimulationSummary(
+            event_counts={"tool_occupied" if name == "tool_occupy" else name: count for name, count in fired.items()},
+            work_when_tool_available=work_when_tool_available_count,
+            tool_unavailable_time=tool_unavailable_time,
+            buffer_maxima=buffer_maxima
+        )
+        state = SimulationState(events, buffer_levels, tool_state, work_when_tool_available) if record else None
+        return state, summary
+
+    def kernel_arguments(self) -> tuple:
+        """The static arguments of kernel.simulate_line for this net, from `pre_ptr`
+        up to and including `n_steps`"""
+        net = self.compiled_net
+        order = np.array([net.transition_index(name)
+                          for name in ["tool_release", "produce", "work", "process1", "process2"]])
+        buffers = np.array([net.place_index(name) for name in BUFFER_NAMES])
+        return (net.pre_ptr, net.pre_place, net.pre_cost, net.post_ptr, net.post_place, net.post_cost,
+                order, net.transition_index("tool_occupy"), net.transition_index("work"),
+                net.place_index("tool"), buffers, self._mean_time, self._time_sd, self.num_steps)
+
+    def run_kernel(self, streams: RandomStreams, marking: np.ndarray, next_fire: np.ndarray,
+                   start_step: int = 0, watch_place: int = -1, watch_level: int = 0,
+                   record: bool = False) -> KernelRun:
+        """Run kernel.simulate_line from `marking` and `next_fire` (which are not
+        modified) at `start_step` on `streams` with the net's current capacities"""
+        return self.run_kernel_batch(streams, marking[None], next_fire[None], self.compiled_net.capacity[None],
+                                     start_step, watch_place, watch_level, record)[0]
+
+    def run_kernel_batch(self, streams: RandomStreams, markings: np.ndarray, next_fire: np.ndarray,
+                         capacities: np.ndarray, start_step: int = 0, watch_place: int = -1,
+                         watch_level: int = 0, record: bool = False) -> List[KernelRun]:
+        """Advance one copy of the line per row of `markings`, `next_fire` and
+        `capacities` (-1 for unbounded) together in one kernel call, all on
+        `streams` (common random numbers), whose uniforms start at or before
+        `start_step`. A watched run stops for all copies as soon as one of them
+        reaches `watch_level`.
+
+        The kernel stops whenever it needs the next block of random numbers,
+        and is resumed after `streams.advance`; this gives the same result as
+        one call on the whole streams. The streams are topped up a block at a
+        time, except for a recorded run, whose traces take memory in
+        proportion to the duration anyway and which gets the random numbers
+        for all remaining seconds at once.
+        """
+        num_lines, num_transitions = next_fire.shape
+        kernel_args = self.kernel_arguments()
+        state = [markings.ravel().copy(), next_fire.ravel().copy(),
+                 np.zeros(next_fire.size, dtype=np.int64),
+                 np.zeros(num_lines * len(BUFFER_NAMES), dtype=np.int64),
+                 np.zeros(2 * num_lines, dtype=np.int64)]
+        chunks = []
+        stop_step, refill = start_step, True
+        while refill:
+            remaining = self.num_steps - stop_step
+            streams.advance(stop_step, state[2].reshape(num_lines, -1),
+                            remaining if record else min(remaining, streams.block_size))
+            step = stop_step
+            stop_step, refill, levels, tool_state, event_step, event_transition, n_events = simulate_line(
+                *state, capacities.ravel(), step, watch_place, watch_level, record, *kernel_args,
+                self.occupy_prob[step:step + len(streams.uniforms)], streams.uniforms,
+                streams.normal_base, streams.normal_ptr, streams.normals)
+            if record:
+                chunks.append((levels[:, :stop_step - step], tool_state[:, :stop_step - step],
+                               event_step[:n_events], event_transition[:n_events]))
+        if len(chunks) > 1:
+            levels, tool_state, event_step, event_transition = [
+                np.concatenate(arrays, axis=-1) for arrays in zip(*chunks)]
+        else:
+            event_step, event_transition = event_step[:n_events], event_transition[:n_events]
+
+        run_markings, run_next_fire, fired, buffer_max, counters = [
+            array.reshape(num_lines, -1) for array in state]
+        event_line = event_transition // num_transitions
+        runs = []
+        for line in range(num_lines):
+            events = event_line == line
+            runs.append(KernelRun(
+                marking=run_markings[line],
+                next_fire=run_next_fire[line],
+                fired=fired[line],
+                buffer_max=buffer_max[line],
+                tool_unavailable_time=int(counters[line, 0]),
+                work_when_tool_available=int(counters[line, 1]),
+                stop_step=stop_step,
+                buffer_levels=levels[line * len(BUFFER_NAMES):(line + 1) * len(BUFFER_NAMES)],
+                tool_state=tool_state[line],
+                event_step=event_step[events],
+                event_transition=event_transition[events] - line * num_transitions
+            ))
+        return runs
+
+    def _run_kernel_simulation(self, streams: RandomStreams) -> SimulationState:
+        """Run the array kernel (see kernel.py) and convert its output to a SimulationState"""
+        run = self.run_kernel(streams, self.petri_net.marking(), np.zeros(len(self.compiled_net.transition_names)),
+                              record=True)
+        self.petri_net.set_marking(run.marking)
+
+        event_names = ["tool_occupied" if name == "tool_occupy" else name
+                       for name in self.compiled_net.transition_names]
+        occupy, work = self._transition_index["tool_occupy"], self._transition_index["work"]
+        tool_state = run.tool_state.tolist()
+        events = []
+        work_when_tool_available = []
+        for step, t in zip(run.event_step.tolist(), run.event_transition.tolist()):
+            events.append(SimulationEvent(float(step), event_names[t]))
+            if t == occupy:
+                work_when_tool_available.append(False)
+            elif t == work and tool_state[step]:
+                work_when_tool_available.append(True)
+        buffer_levels = {name: levels.tolist() for name, levels in zip(BUFFER_NAMES, run.buffer_levels)}
         return SimulationState(events, buffer_levels, tool_state, work_when_tool_available)
 
+    def _summarize_kernel_run(self, run: KernelRun) -> SimulationSummary:
+        event_counts = {"tool_occupied" if name == "tool_occupy" else name: count
+                        for name, count in zip(self.compiled_net.transition_names, run.fired.tolist())}
+        return SimulationSummary(
+            event_counts=event_counts,
+            work_when_tool_available=run.work_when_tool_available,
+            tool_unavailable_time=run.tool_unavailable_time,
+            buffer_maxima=dict(zip(BUFFER_NAMES, run.buffer_max.tolist()))
+        )
+
+    def _run_replication(self, streams: RandomStreams, keep_traces: bool) -> SimulationResults:
+        """Results of one replication from the initial marking, summarized as
+        the engine runs; the per-second traces are only recorded with `keep_traces`."""
+        self.reset()
+        if self.engine != "kernel":
+            state, summary = self._run_reference(streams, record=keep_traces)
+            return self.analyze_summary(summary, state.buffer_levels if keep_traces else {})
+        run = self.run_kernel(streams, self.compiled_net.marking, np.zeros(len(self.compiled_net.transition_names)),
+                              record=keep_traces)
+        self.petri_net.set_marking(run.marking)
+        self._firing_rate = run.fired / self.num_steps
+        return self._analyze_kernel_run(run, keep_traces)
+
+    def _analyze_kernel_run(self, run: KernelRun, keep_traces: bool) -> SimulationResults:
+        buffer_levels = dict(zip(BUFFER_NAMES, run.buffer_levels)) if keep_traces else {}
+        return self.analyze_summary(self._summarize_kernel_run(run), buffer_levels)
+
+    def summarize_simulation_state(self, state: SimulationState) -> SimulationSummary:
+        """Event counts, tool statistics and buffer maxima of a simulation state"""
+        event_counts = {name: 0 for name in ["tool_occupied", "tool_release", "produce", "work",
+                                             "process1", "process2"]}
+        for e in state.events:
+            event_counts[e.type] += 1
+        tool_available_time = sum(1 for x in state.tool_state if x)
+        return SimulationSummary(
+            event_counts=event_counts,
+            work_when_tool_available=sum(1 for x in state.work_when_tool_available if x),
+            tool_unavailable_time=len(state.tool_state) - tool_available_time,
+            buffer_maxima={name: int(np.ceil(max(levels))) for name, levels in state.buffer_levels.items()}
+        )
+
     def analyze_simulation_state(self, state: SimulationState) -> SimulationResults:
         """Analyze a simulation state to produce results"""
-        # print(state)
-        # Count events
-        production_events = [e for e in state.events if e.type == "produce"]
-        work_events = [e for e in state.events if e.type == "work"]
-        process1_events = [e for e in state.events if e.type == "process1"]
-        process2_events = [e for e in state.events if e.type == "process2"]
-        tool_occupied_events = [e for e in state.events if e.type == "tool_occupied"]
-        
-        # Calculate tool unavailability periods
-        tool_available_time = sum(1 for x in state.tool_state if x)
-        tool_unavailable_time = len(state.tool_state) - tool_available_time
-        
+        return self.analyze_summary(self.summarize_simulation_state(state), state.buffer_levels)
+
+    def analyze_summary(self, summary: SimulationSummary,
+                        buffer_levels: Optional[Dict[str, List[int]]] = None) -> SimulationResults:
+        """Analyze a simulation summary to produce results; `buffer_levels` are
+        passed through (empty if omitted)"""
+        counts = summary.event_counts
+
         # Calculate rates
         hours = self.simulation_duration / 3600
 
         # Production Rate
-        production_rate = len(production_events) / hours
+        production_rate = counts["produce"] / hours
 
         # Work rate if tool is available
-        work_rate = sum(1 for x in state.work_when_tool_available if x) / hours
+        work_rate = summary.work_when_tool_available / hours
 
         # Post processing rate
-        post_processing_rate = (len(process1_events) + len(process2_events)) / hours
-        
+        post_processing_rate = (counts["process1"] + counts["process2"]) / hours
+
         # Calculate tool unavailability stats
-        tool_unavail_freq = len(tool_occupied_events) / hours
-        avg_unavail_duration = tool_unavailable_time / len(tool_occupied_events) if tool_occupied_events else 0
-        
-        # Calculate buffer sizes
-        buffer_sizes = {
-            name: int(np.ceil(max(levels)))
-            for name, levels in state.buffer_levels.items()
-        }
+        tool_occupied_events = counts["tool_occupied"]
+        tool_unavail_freq = tool_occupied_events / hours
+        avg_unavail_duration = summary.tool_unavailable_time / tool_occupied_events if tool_occupied_events else 0
 
-        # Get buffer levels
-        buffer_levels=state.buffer_levels
-        
         return SimulationResults(
             production_rate=production_rate,
             tool_work_rate=work_rate,
             tool_unavailable_stats=(tool_unavail_freq, avg_unavail_duration),
             post_processing_rate=post_processing_rate,
-            buffer_sizes=buffer_sizes,
-            buffer_levels=buffer_levels
+            buffer_sizes=dict(summary.buffer_maxima),
+            buffer_levels=buffer_levels if buffer_levels is not None else {}
         )
 
-    def run_monte_carlo(self, num_simulations: int = 100) -> SimulationResults:
-        """Run multiple simulations and average results"""
-        results = []
-        for _ in range(num_simulations):
-            # Reset state
-            for place in self.petri_net.places:
-                place.tokens = 1 if place in [self.production, self.robot1, self.robot2] else 0
-                if place == self.tool:
-                    place.tokens = 1
-            
-            state = self.run_single_simulation()
-            results.append(self.analyze_simulation_state(state))
-
-        re_bl = {'buffer1': [], 'buffer2': [], 'buffer3': []}
-        for r in results:
-            buffer_level = r.buffer_levels
-            for k, v in buffer_level.items():
-                re_bl[k].append(np.array(v))
-        for k, v in re_bl.items():
-            re_bl[k] = np.mean(v, axis=0)
-
-        # Average results
-        return SimulationResults(
-            production_rate=np.mean([r.production_rate for r in results]),
-            tool_work_rate=np.mean([r.tool_work_rate for r in results]),
-            tool_unavailable_stats=(
-                np.mean([r.tool_unavailable_stats[0] for r in results]),
-                np.mean([r.tool_unavailable_stats[1] for r in results])
-            ),
-            post_processing_rate=np.mean([r.post_processing_rate for r in results]),
-            buffer_sizes={
-                name: int(np.ceil(np.percentile([r.buffer_sizes[name] for r in results], 95)))
-                for name in ['buffer1', 'buffer2', 'buffer3']
-            },
-            buffer_levels=re_bl
-        )
+    def run_monte_carlo(self, num_simulations: int = 100, seed: SeedLike = None,
+                        keep_traces: bool = True) -> SimulationResults:
+        """Run multiple simulations and average results.
+
+        Each replication is folded into a MonteCarloAggregator as soon as it
+        finishes, so memory does not grow with `num_simulations`. With
+        `keep_traces=False`, neither engine records per-second traces or events,
+        only counts and buffer maxima, and the random numbers are drawn a block
+        at a time (see RandomStreams), so memory does not grow with the
+        duration either; the mean buffer trajectories are left empty.
+
+        Replication i is seeded with `child_seed(batch_seed, i)`, where the batch
+        seed comes from `seed` or, if omitted, is spawned from `self.seed_sequence`.
+        The batch seed is kept in `self.last_batch_seed` for `replay_replication`.
+        """
+        batch_seed = self.seed_sequence.spawn(1)[0] if seed is None else as_seed_sequence(seed)
+        self.last_batch_seed = batch_seed
+        self.last_sweep_capacities = None
+
+        aggregator = MonteCarloAggregator(keep_traces)
+        for i in range(num_simulations):
+            aggregator.add(self._run_replication(self.random_streams(child_seed(batch_seed, i)), keep_traces))
+
+        return aggregator.result()
+
+    def sweep_buffer_capacities(self, capacity_vectors: Sequence, num_simulations: int = 100,
+                                seed: SeedLike = None, keep_traces: bool = True) -> List[SimulationResults]:
+        """Run a Monte Carlo batch for each capacity vector (see set_buffer_capacities).
+
+        Each replication advances one copy of the line per vector in a single
+        kernel call (run_kernel_batch), whatever `engine` is, with a (vectors,
+        places) capacity matrix; the net's own capacities are left untouched.
+        All copies share the random streams of the replication (common random
+        numbers), so differences between the results are due to the capacities
+        rather than sampling noise. Replication i uses the same streams as in
+        `run_monte_carlo(num_simulations, seed)`. The batch seed and the vectors
+        are kept for `replay_replication(i, vector=k)`.
+        """
+        batch_seed = self.seed_sequence.spawn(1)[0] if seed is None else as_seed_sequence(seed)
+        vectors = [validate_buffer_capacities(vector) for vector in capacity_vectors]
+        self.last_batch_seed = batch_seed
+        self.last_sweep_capacities = vectors
+
+        capacities = np.array([self._capacity_row(vector) for vector in vectors])
+        markings = np.tile(self.compiled_net.marking, (len(capacities), 1))
+        next_fire = np.zeros((len(capacities), len(self.compiled_net.transition_names)))
+        aggregators = [MonteCarloAggregator(keep_traces) for _ in capacity_vectors]
+        for i in range(num_simulations):
+            runs = self.run_kernel_batch(self.random_streams(child_seed(batch_seed, i)), markings, next_fire,
+                                         capacities, record=keep_traces)
+            for run, aggregator in zip(runs, aggregators):
+                aggregator.add(self._analyze_kernel_run(run, keep_traces))
+        return [aggregator.result() for aggregator in aggregators]
+
+    def replay_replication(self, index: int, seed: SeedLike = None,
+                           vector: Optional[int] = None) -> SimulationState:
+        """Re-run replication `index` of a Monte Carlo batch and return its full state.
+
+        `seed` is the seed given to `run_monte_carlo`; if omitted, the most recent
+        batch is replayed. Replays are identical across engines. A Generator
+        seed cannot be replayed, since `run_monte_carlo` advanced it; replay
+        with `self.last_batch_seed` instead.
+
+        If the most recent batch was a `sweep_buffer_capacities`, `vector`
+        selects the capacity vector of that sweep to replay with; the net's
+        own capacities are restored afterwards.
+        """
+        if vector is None and seed is None and self.last_sweep_capacities is not None:
+            raise ValueError("The last batch was a capacity sweep; pass the index of the swept vector to replay.")
+        if vector is not None and self.last_sweep_capacities is None:
+            raise ValueError("vector is only valid after sweep_buffer_capacities.")
+        if isinstance(seed, np.random.Generator):
+            raise ValueError("Cannot replay a batch seeded with a Generator, which has since been advanced; "
+                             "pass the batch's last_batch_seed instead.")
+        if seed is not None:
+            batch_seed = as_seed_sequence(seed)
+        elif self.last_batch_seed is not None:
+            batch_seed = self.last_batch_seed
+        else:
+            raise ValueError("No Monte Carlo batch to replay; pass the seed given to run_monte_carlo.")
+        if vector is None:
+            self.reset()
+            return self.run_single_simulation(seed=child_seed(batch_seed, index))
+
+        original = self.buffer_capacities()
+        self.set_buffer_capacities(self.last_sweep_capacities[vector])
+        try:
+            self.reset()
+            return self.run_single_simulation(seed=child_seed(batch_seed, index))
+        finally:
+            self.set_buffer_capacities(original)
 
     def plot_buffer_levels(self, results: SimulationResults):
         """Plot buffer levels over time"""
+        # Imported lazily: matplotlib dominates import time and the simulation
+        # core must stay NumPy-only for short-lived worker processes.
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(10, 6))
         for buffer_name, levels in results.buffer_levels.items():
             plt.plot(levels, label=buffer_name)
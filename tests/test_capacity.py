@@ -0,0 +1,124 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from petrinet import Place, Arc, Transition
+from sim import TransitionParams, TransitionConfig, StochasticProductionSimulation
+from test_sim import create_base_config
+
+def create_slow_processing_config():
+    return TransitionConfig(
+        **{**create_base_config().__dict__,
+           'process1': TransitionParams(60.0, 10.0),
+           'process2': TransitionParams(60.0, 10.0)}
+    )
+
+def test_transition_blocked_by_full_output_place():
+    source = Place("source", 1)
+    buffer = Place("buffer", 2, capacity=2)
+    t = Transition("t", [Arc(source, 1)], [Arc(source, 1), Arc(buffer, 1)])
+    assert not t.is_enabled()
+    assert not t.fire()
+
+    buffer.capacity = 3
+    assert t.fire()
+    assert buffer.tokens == 3
+
+def test_self_loop_on_full_place_is_not_blocked():
+    """Test that tokens consumed from a full place free room for the tokens produced"""
+    buffer = Place("buffer", 2, capacity=2)
+    t = Transition("t", [Arc(buffer, 1)], [Arc(buffer, 1)])
+    assert t.is_enabled()
+
+@pytest.mark.parametrize("engine", ["reference", "kernel"])
+def test_buffer_levels_respect_capacities(engine):
+    sim = StochasticProductionSimulation(
+        transition_config=create_slow_processing_config(),
+        simulation_duration=3600.0,
+        engine=engine,
+        buffer_capacities={"buffer1": 2, "buffer2": 3, "buffer3": 3}
+    )
+    results = sim.run_monte_carlo(num_simulations=10, seed=0)
+    assert results.buffer_sizes == {"buffer1": 2, "buffer2": 3, "buffer3": 3}
+
+def test_capacity_engines_match():
+    capacities = {"buffer2": 2, "buffer3": 4}
+    states = []
+    for engine in ["reference", "kernel"]:
+        sim = StochasticProductionSimulation(
+            transition_config=create_slow_processing_config(),
+            simulation_duration=3600.0,
+            engine=engine,
+            buffer_capacities=capacities
+        )
+        states.append(sim.run_single_simulation(seed=4))
+    assert states[0] == states[1]
+
+def test_capacity_sweep():
+    """Test that tighter buffers lose throughput and the unbounded vector reproduces run_monte_carlo"""
+    sim = StochasticProductionSimulation(
+        transition_config=create_slow_processing_config(),
+        simulation_duration=3600.0,
+        engine="kernel"
+    )
+    unbounded, loose, tight = sim.sweep_buffer_capacities(
+        [{}, [None, 6, 6], [None, 1, 1]], num_simulations=10, seed=3)
+    reference = sim.run_monte_carlo(num_simulations=10, seed=3)
+
+    assert unbounded.production_rate == reference.production_rate
+    assert unbounded.buffer_sizes == reference.buffer_sizes
+    assert tight.buffer_sizes["buffer2"] <= 1
+    assert tight.tool_work_rate < loose.tool_work_rate <= unbounded.tool_work_rate
+    assert sim.buffer_capacities() == {"buffer1": None, "buffer2": None, "buffer3": None}
+
+@pytest.mark.parametrize("engine", ["reference", "kernel"])
+def test_capacity_sweep_matches_separate_batches(engine):
+    """Test that every copy in the batched sweep matches a Monte Carlo batch with its capacities set"""
+    vectors = [{"buffer2": 2, "buffer3": 4}, [3, None, 1]]
+    sim = StochasticProductionSimulation(
+        transition_config=create_slow_processing_config(),
+        simulation_duration=3600.0,
+        engine=engine
+    )
+    swept = sim.sweep_buffer_capacities(vectors, num_simulations=5, seed=6)
+    for capacities, results in zip(vectors, swept):
+        separate = StochasticProductionSimulation(
+            transition_config=create_slow_processing_config(),
+            simulation_duration=3600.0,
+            engine=engine
+        )
+        separate.set_buffer_capacities(capacities)
+        expected = separate.run_monte_carlo(num_simulations=5, seed=6)
+
+        assert results.production_rate == expected.production_rate
+        assert results.tool_unavailable_stats == expected.tool_unavailable_stats
+        assert results.buffer_sizes == expected.buffer_sizes
+        for name in expected.buffer_levels:
+            assert np.array_equal(results.buffer_levels[name], expected.buffer_levels[name])
+
+@pytest.mark.parametrize("engine", ["reference", "kernel"])
+def test_replay_swept_replication(engine):
+    """Test that a sweep replication is replayed with the selected vector's capacities"""
+    sim = StochasticProductionSimulation(
+        transition_config=create_slow_processing_config(),
+        simulation_duration=3600.0,
+        engine=engine
+    )
+    tight, loose = sim.sweep_buffer_capacities([[1, 1, 1], [None, 6, 6]], num_simulations=1, seed=0)
+    replay_tight = sim.replay_replication(0, vector=0)
+    replay_loose = sim.replay_replication(0, vector=1)
+
+    assert {name: max(levels) for name, levels in replay_tight.buffer_levels.items()} == tight.buffer_sizes
+    assert {name: max(levels) for name, levels in replay_loose.buffer_levels.items()} == loose.buffer_sizes
+    assert sim.buffer_capacities() == {"buffer1": None, "buffer2": None, "buffer3": None}
+    with pytest.raises(ValueError):
+        sim.replay_replication(0)
+
+def test_invalid_capacities_rejected():
+    sim = StochasticProductionSimulation(transition_config=create_base_config())
+    with pytest.raises(ValueError):
+        sim.set_buffer_capacities({"buffer4": 3})
+    with pytest.raises(ValueError):
+        sim.set_buffer_capacities({"buffer1": -1})
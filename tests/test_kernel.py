@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+import kernel
+import sim
+from sim import StochasticProductionSimulation
+from test_sim import create_base_config
+
+def run_engine(engine, seed):
+    simulation = StochasticProductionSimulation(
+        transition_config=create_base_config(),
+        simulation_duration=3600.0,
+        engine=engine
+    )
+    return simulation.run_single_simulation(seed=seed), simulation.petri_net.marking()
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_kernel_matches_reference(seed):
+    """Test that the array kernel reproduces the reference engine exactly"""
+    reference_state, reference_marking = run_engine("reference", seed)
+    kernel_state, kernel_marking = run_engine("kernel", seed)
+
+    assert kernel_state == reference_state
+    assert np.array_equal(kernel_marking, reference_marking)
+
+def test_pure_python_fallback_matches_reference(monkeypatch):
+    """Test that the NumPy/list fallback used without Numba gives the same state"""
+    monkeypatch.setattr(sim, "simulate_line", kernel.simulate_line_lists)
+    reference_state, _ = run_engine("reference", 7)
+    fallback_state, _ = run_engine("kernel", 7)
+
+    assert fallback_state == reference_state
+
+def test_broken_numba_falls_back_to_python(monkeypatch):
+    """Test that an installed Numba that fails to import falls back to the list kernel"""
+    monkeypatch.setitem(sys.modules, "numba", None)  # makes `import numba` raise ImportError
+    monkeypatch.setattr(kernel, "HAVE_NUMBA", True)
+    monkeypatch.setattr(kernel, "_simulate_line_impl", None)
+
+    assert not kernel.numba_enabled()
+    assert kernel._simulate_line_impl is kernel.simulate_line_lists
+    reference_state, _ = run_engine("reference", 2)
+    fallback_state, _ = run_engine("kernel", 2)
+    assert fallback_state == reference_state
+
+def test_compile_csr_layout():
+    """Test that compiled arcs match the Transition objects"""
+    simulation = StochasticProductionSimulation(transition_config=create_base_config())
+    net = simulation.compiled_net
+    work = net.transition_index("work")
+    inputs = net.pre_place[net.pre_ptr[work]:net.pre_ptr[work + 1]]
+    outputs = net.post_place[net.post_ptr[work]:net.post_ptr[work + 1]]
+
+    assert [net.place_names[p] for p in inputs] == ["buffer1", "tool"]
+    assert [net.place_names[p] for p in outputs] == ["tool", "buffer2", "buffer3"]
+    assert net.marking.tolist() == [1, 0, 0, 0, 1, 0, 1, 1]
+    assert net.capacity.tolist() == [-1] * 8
+
+def test_unknown_engine_rejected():
+    with pytest.raises(ValueError):
+        StochasticProductionSimulation(transition_config=create_base_config(), engine="fast")
+
+def test_stopped_run_resumes_exactly():
+    """Test that a run stopped at a buffer level and resumed matches an uninterrupted run"""
+    simulation = StochasticProductionSimulation(transition_config=create_base_config(), simulation_duration=3600.0)
+    net = simulation.compiled_net
+    n_transitions = len(net.transition_names)
+    streams = simulation.random_streams(np.random.SeedSequence(5))
+    # Draw the random numbers of the whole run
+    streams.advance(0, np.zeros(n_transitions, dtype=np.int64), simulation.num_steps)
+
+    def initial_state():
+        return [net.marking.copy(), np.zeros(n_transitions), np.zeros(n_transitions, dtype=np.int64),
+                np.zeros(3, dtype=np.int64), np.zeros(2, dtype=np.int64)]
+
+    def run(state, start_step, watch_place, watch_level, record):
+        return kernel.simulate_line(*state, net.capacity, start_step, watch_place, watch_level, record,
+                                    *simulation.kernel_arguments(), simulation.occupy_prob[start_step:],
+                                    streams.uniforms[start_step:],
+                                    streams.normal_base, streams.normal_ptr, streams.normals)
+
+    full_state = initial_state()
+    full = run(full_state, 0, -1, 0, True)
+    assert full[:2] == (simulation.num_steps, False)
+
+    resumed_state = initial_state()
+    stop = run(resumed_state, 0, net.place_index("buffer2"), 2, False)[0]
+    assert 0 < stop < simulation.num_steps
+    assert max(full[2][1, :stop]) < 2 <= full[2][1, stop]
+    rest = run(resumed_state, stop, -1, 0, True)
+
+    for resumed, uninterrupted in zip(resumed_state, full_state):
+        assert np.array_equal(resumed, uninterrupted)
+    assert np.array_equal(rest[2], full[2][:, stop:])
+
+@pytest.mark.parametrize("engine", sim.ENGINES)
+def test_block_size_does_not_change_the_run(engine):
+    """Test that drawing the random numbers in small blocks gives the same run as one large block"""
+    simulation = StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0, engine=engine)
+    seed = np.random.SeedSequence(3)
+    states = []
+    for block_size in [simulation.num_steps, 7]:
+        simulation.reset()
+        states.append(simulation._simulate(sim.RandomStreams(seed, simulation._firing_rate, block_size=block_size)))
+    assert states[0] == states[1]
+
+    streams = sim.RandomStreams(seed, simulation._firing_rate, block_size=7)
+    produce = simulation.compiled_net.transition_index("produce")
+    direct = np.random.default_rng(sim.child_seed(seed, 1 + produce)).standard_normal(100)
+    assert np.array_equal([streams.normal(produce, k) for k in range(100)], direct)
+
+def test_monte_carlo_engines_match():
+    """Test that the kernel's array summaries give the same Monte Carlo results as the reference engine"""
+    results = [
+        StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0, engine=engine)
+        .run_monte_carlo(num_simulations=5, seed=9)
+        for engine in ["reference", "kernel"]
+    ]
+
+    assert results[0].production_rate == results[1].production_rate
+    assert results[0].tool_work_rate == results[1].tool_work_rate
+    assert results[0].tool_unavailable_stats == results[1].tool_unavailable_stats
+    assert results[0].buffer_sizes == results[1].buffer_sizes
+    for name in results[0].buffer_levels:
+        assert np.array_equal(results[0].buffer_levels[name], results[1].buffer_levels[name])
@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from sim import StochasticProductionSimulation, child_seed
+from multiline import MultiLineProductionSimulation
+from test_sim import create_base_config
+
+def test_single_line_matches_time_stepped_simulation():
+    """Test that the event-driven engine reproduces the statistics of the reference model"""
+    config = create_base_config()
+    reference = StochasticProductionSimulation(config, simulation_duration=3600.0 * 2, engine="kernel")
+    expected = reference.run_monte_carlo(num_simulations=300, seed=0)
+    multi = MultiLineProductionSimulation(config, num_lines=1, simulation_duration=3600.0 * 2)
+    line = multi.run_monte_carlo(num_simulations=300, seed=1).lines[0]
+
+    assert line.production_rate == pytest.approx(expected.production_rate, rel=0.02)
+    assert line.tool_work_rate == pytest.approx(expected.tool_work_rate, rel=0.1)
+    assert line.post_processing_rate == pytest.approx(expected.post_processing_rate, rel=0.02)
+    expected_means = {name: np.mean(levels) for name, levels in expected.buffer_levels.items()}
+    for name, mean_level in line.mean_buffer_levels.items():
+        assert mean_level == pytest.approx(expected_means[name], rel=0.15)
+
+def test_shared_places_exist_once():
+    multi = MultiLineProductionSimulation(create_base_config(), num_lines=3, shared=["tool", "robot2"])
+    places = multi.compiled_net.place_names
+    transitions = multi.compiled_net.transition_names
+
+    assert places.count("tool") == 1 and places.count("robot2") == 1
+    assert "line2.robot1" in places and "line2.tool" not in places
+    assert transitions[:2] == ["tool_occupy", "tool_release"]
+    assert len(transitions) == 2 + 4 * 3
+
+def test_shared_robot_limits_throughput_of_all_lines():
+    config = create_base_config()
+    separate = MultiLineProductionSimulation(config, num_lines=4, simulation_duration=3600.0 * 2)
+    shared = MultiLineProductionSimulation(config, num_lines=4, simulation_duration=3600.0 * 2, shared=["robot1"])
+    separate_rates = [line.post_processing_rate for line in separate.run_monte_carlo(10, seed=0).lines]
+    shared_rates = [line.post_processing_rate for line in shared.run_monte_carlo(10, seed=0).lines]
+
+    # One robot1 serves about 120 items/hour in total instead of 120 per line
+    assert sum(shared_rates) < 0.75 * sum(separate_rates)
+    assert max(shared_rates) - min(shared_rates) < 0.1 * max(shared_rates)
+
+def test_multiline_is_reproducible_and_respects_capacities():
+    multi = MultiLineProductionSimulation(
+        create_base_config(), num_lines=5, simulation_duration=3600.0,
+        shared=["robot1"], buffer_capacities={"buffer2": 3}
+    )
+    first = multi.run_single_simulation(seed=5)
+    assert first == multi.run_single_simulation(seed=5)
+    assert all(line.buffer_sizes["buffer2"] <= 3 for line in first.lines)
+
+def test_monte_carlo_aggregates_runs():
+    """Test that streaming aggregation gives the same statistics as keeping every run"""
+    multi = MultiLineProductionSimulation(create_base_config(), num_lines=2, shared=["robot1"])
+    aggregated = multi.run_monte_carlo(num_simulations=12, seed=5)
+    batch_seed = np.random.SeedSequence(5)
+    runs = [multi.run_single_simulation(seed=child_seed(batch_seed, i)) for i in range(12)]
+
+    assert aggregated.num_events == pytest.approx(np.mean([run.num_events for run in runs]))
+    for i, line in enumerate(aggregated.lines):
+        line_runs = [run.lines[i] for run in runs]
+        assert line.production_rate == pytest.approx(np.mean([r.production_rate for r in line_runs]))
+        assert line.tool_work_rate == pytest.approx(np.mean([r.tool_work_rate for r in line_runs]))
+        assert line.buffer_sizes == {
+            name: int(np.ceil(np.percentile([r.buffer_sizes[name] for r in line_runs], 95)))
+            for name in ["buffer1", "buffer2", "buffer3"]
+        }
+        for name, mean_level in line.mean_buffer_levels.items():
+            assert mean_level == pytest.approx(np.mean([r.mean_buffer_levels[name] for r in line_runs]))
+
+def test_invalid_multiline_arguments():
+    config = create_base_config()
+    with pytest.raises(ValueError):
+        MultiLineProductionSimulation(config)
+    with pytest.raises(ValueError):
+        MultiLineProductionSimulation([config, config], num_lines=3)
+    with pytest.raises(ValueError):
+        MultiLineProductionSimulation(config, num_lines=2, shared=["buffer1"])
+    with pytest.raises(ValueError):
+        MultiLineProductionSimulation(config, num_lines=2, buffer_capacities={"bufer2": 3})
+    with pytest.raises(ValueError):
+        MultiLineProductionSimulation(config, num_lines=2, buffer_capacities={"buffer1": -2})
@@ -0,0 +1,67 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from sensitivity import (PARAMETER_NAMES, OUTPUT_NAMES, config_to_vector, vector_to_config, default_bounds,
+                         saltelli_design, sobol_indices, morris_design, morris_indices, evaluate_design)
+from test_sim import create_base_config
+
+UNIT_BOUNDS = {name: (0.0, 1.0) for name in PARAMETER_NAMES}
+
+def test_config_vector_round_trip():
+    config = create_base_config()
+    assert len(PARAMETER_NAMES) == 14
+    assert vector_to_config(config_to_vector(config)) == config
+    bounds = default_bounds(config)
+    assert bounds["produce.mean_time"] == (30.0, 50.0)
+    assert bounds["tool_occupy.time_sd"] == (0.0, 0.0)
+
+def test_sobol_indices_of_additive_function():
+    """Test the estimators on y = x0 + 2 x1, where S1 = ST = (0.2, 0.8) and all other indices vanish"""
+    points = saltelli_design(UNIT_BOUNDS, num_samples=4000, seed=0)
+    outputs = points[:, 0] + 2 * points[:, 1]
+    indices = sobol_indices(outputs, num_bootstrap=50, seed=1, output_names=["y"])
+
+    expected = np.zeros(14)
+    expected[:2] = [0.2, 0.8]
+    assert np.allclose(indices.first_order[0], expected, atol=0.05)
+    assert np.allclose(indices.total_order[0], expected, atol=0.05)
+    low, high = indices.total_order_ci[0, 1]
+    assert low < indices.total_order[0, 1] < high
+
+def test_sobol_rejects_non_saltelli_outputs():
+    with pytest.raises(ValueError):
+        sobol_indices(np.zeros(17))
+
+def test_morris_indices_of_linear_function():
+    design = morris_design(UNIT_BOUNDS, num_trajectories=5, seed=0)
+    outputs = 3 * design.points[:, 0] - design.points[:, 5]
+    indices = morris_indices(design, outputs)
+
+    assert design.points.shape == (5 * 15, 14)
+    assert indices.mu_star[0, 0] == pytest.approx(3.0)
+    assert indices.mu_star[0, 5] == pytest.approx(1.0)
+    assert np.allclose(np.delete(indices.mu_star[0], [0, 5]), 0.0)
+    assert np.allclose(indices.sigma, 0.0)
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_evaluate_design_runs_simulations(max_workers):
+    points = np.array([config_to_vector(create_base_config())] * 3)
+    outputs = evaluate_design(points, num_simulations=2, simulation_duration=600.0, seed=4,
+                              max_workers=max_workers, batch_size=2)
+
+    assert outputs.shape == (3, len(OUTPUT_NAMES))
+    # Common random numbers: identical points give identical outputs
+    assert np.array_equal(outputs[0], outputs[2])
+    assert outputs[0, 0] > 0
+
+def test_evaluate_design_resolves_generator_seed_once():
+    """Test that a Generator seed gives every point the same batch seed"""
+    points = np.array([config_to_vector(create_base_config())] * 3)
+    outputs = evaluate_design(points, num_simulations=2, simulation_duration=600.0,
+                              seed=np.random.default_rng(4), max_workers=1, batch_size=2)
+
+    assert np.array_equal(outputs[0], outputs[1])
+    assert np.array_equal(outputs[0], outputs[2])
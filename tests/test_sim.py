@@ -1,9 +1,10 @@
 import sys
 import os
+import tracemalloc
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pytest
-from sim import TransitionConfig, TransitionParams, StochasticProductionSimulation
+from sim import TransitionConfig, TransitionParams, StochasticProductionSimulation, MonteCarloAggregator, histogram_percentile
 import numpy as np
 
 def create_base_config():
@@ -103,4 +104,143 @@ def test_production_rate_consistency():
     # Based on configured mean times, should be roughly 60-100 items/hour
     assert 60 <= mean_rate <= 100
     # Standard deviation should be relatively small
-    assert std_rate < mean_rate * 0.2  # Within 20% of mean
\ No newline at end of file
+    assert std_rate < mean_rate * 0.2  # Within 20% of mean
+
+def test_core_import_is_numpy_only():
+    """Test that importing the simulation core does not pull in plotting libraries"""
+    import subprocess
+    probe = (
+        "import sys, sim; "
+        "print(','.join(m for m in ('matplotlib', 'seaborn', 'pandas', 'graphviz') if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == ""
+
+
+def test_seeded_monte_carlo_is_reproducible():
+    """Test that equal seeds give equal results and different seeds differ"""
+    config = create_base_config()
+    results_a = StochasticProductionSimulation(config, simulation_duration=3600.0).run_monte_carlo(5, seed=42)
+    results_b = StochasticProductionSimulation(config, simulation_duration=3600.0).run_monte_carlo(5, seed=42)
+    results_c = StochasticProductionSimulation(config, simulation_duration=3600.0).run_monte_carlo(5, seed=43)
+
+    assert results_a.production_rate == results_b.production_rate
+    assert all(np.array_equal(results_a.buffer_levels[k], results_b.buffer_levels[k]) for k in results_a.buffer_levels)
+    assert not all(np.array_equal(results_a.buffer_levels[k], results_c.buffer_levels[k]) for k in results_a.buffer_levels)
+
+def test_simulation_seed_fixes_sequence_of_batches():
+    """Test that a seeded simulation gives fresh but reproducible batches"""
+    config = create_base_config()
+    sim_a = StochasticProductionSimulation(config, simulation_duration=3600.0, seed=np.random.default_rng(3))
+    sim_b = StochasticProductionSimulation(config, simulation_duration=3600.0, seed=np.random.default_rng(3))
+    first_a, second_a = sim_a.run_monte_carlo(3), sim_a.run_monte_carlo(3)
+    first_b, second_b = sim_b.run_monte_carlo(3), sim_b.run_monte_carlo(3)
+
+    assert np.array_equal(first_a.buffer_levels["buffer1"], first_b.buffer_levels["buffer1"])
+    assert np.array_equal(second_a.buffer_levels["buffer1"], second_b.buffer_levels["buffer1"])
+    assert not np.array_equal(first_a.buffer_levels["buffer1"], second_a.buffer_levels["buffer1"])
+
+def test_replay_replication():
+    """Test that a replication can be replayed by index, on either engine"""
+    config = create_base_config()
+    sim = StochasticProductionSimulation(config, simulation_duration=3600.0)
+    results = sim.run_monte_carlo(num_simulations=1, seed=11)
+    replay = sim.replay_replication(0)
+    replay_kernel = StochasticProductionSimulation(
+        config, simulation_duration=3600.0, engine="kernel"
+    ).replay_replication(0, seed=11)
+
+    assert replay.buffer_levels == {k: v.tolist() for k, v in results.buffer_levels.items()}
+    assert replay_kernel == replay
+    assert sim.replay_replication(2, seed=11) != replay
+
+def test_replay_replication_seeded_with_generator():
+    """Test that a Generator-seeded batch is replayed from last_batch_seed and
+    that replaying with the (advanced) Generator is rejected"""
+    sim = StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0)
+    generator = np.random.default_rng(12)
+    results = sim.run_monte_carlo(num_simulations=1, seed=generator)
+    batch_seed = sim.last_batch_seed
+
+    assert sim.replay_replication(0).buffer_levels == {k: v.tolist() for k, v in results.buffer_levels.items()}
+    assert sim.replay_replication(0, seed=batch_seed) == sim.replay_replication(0)
+    with pytest.raises(ValueError):
+        sim.replay_replication(0, seed=generator)
+
+
+def test_untraced_reference_run_keeps_only_a_summary():
+    """Test that the reference engine's running summary matches its full state"""
+    sim = StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0)
+    state, summary = sim._run_reference(sim.random_streams(np.random.SeedSequence(4)), record=True)
+    sim.reset()
+    untraced_state, untraced_summary = sim._run_reference(sim.random_streams(np.random.SeedSequence(4)),
+                                                          record=False)
+
+    assert untraced_state is None
+    assert summary == untraced_summary == sim.summarize_simulation_state(state)
+
+def test_histogram_percentile_matches_numpy():
+    rng = np.random.default_rng(0)
+    for size in [1, 2, 7, 100]:
+        sample = rng.integers(0, 30, size=size)
+        for q in [0, 50, 95, 100]:
+            assert histogram_percentile(np.bincount(sample), q) == pytest.approx(np.percentile(sample, q))
+
+def test_aggregator_matches_averaging_all_results():
+    """Test that streaming aggregation gives the same statistics as keeping every replication"""
+    sim = StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0, seed=8)
+    results = []
+    for _ in range(20):
+        sim.reset()
+        results.append(sim.analyze_simulation_state(sim.run_single_simulation()))
+    aggregator = MonteCarloAggregator()
+    for r in results:
+        aggregator.add(r)
+    aggregated = aggregator.result()
+
+    assert aggregator.count == 20
+    assert aggregated.production_rate == pytest.approx(np.mean([r.production_rate for r in results]))
+    assert aggregated.tool_unavailable_stats[1] == pytest.approx(np.mean([r.tool_unavailable_stats[1] for r in results]))
+    assert aggregated.buffer_sizes == {
+        name: int(np.ceil(np.percentile([r.buffer_sizes[name] for r in results], 95)))
+        for name in ['buffer1', 'buffer2', 'buffer3']
+    }
+    for name, levels in aggregated.buffer_levels.items():
+        assert np.allclose(levels, np.mean([r.buffer_levels[name] for r in results], axis=0))
+
+def test_empty_aggregator_rejected():
+    with pytest.raises(ValueError):
+        MonteCarloAggregator().result()
+
+@pytest.mark.parametrize("engine", ["reference", "kernel"])
+def test_monte_carlo_without_traces(engine):
+    sim = StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0, engine=engine)
+    with_traces = sim.run_monte_carlo(num_simulations=5, seed=1)
+    without_traces = sim.run_monte_carlo(num_simulations=5, seed=1, keep_traces=False)
+
+    assert without_traces.buffer_levels == {}
+    assert without_traces.production_rate == with_traces.production_rate
+    assert without_traces.tool_work_rate == with_traces.tool_work_rate
+    assert without_traces.tool_unavailable_stats == with_traces.tool_unavailable_stats
+    assert without_traces.buffer_sizes == with_traces.buffer_sizes
+
+# Peak memory levels off once the random streams have been topped up by a
+# full block (RandomStreams.block_size), which both durations are long enough for
+@pytest.mark.parametrize("engine, durations", [("reference", [5, 15]), ("kernel", [10, 40])])
+def test_monte_carlo_without_traces_memory_does_not_grow_with_duration(engine, durations):
+    # Warm up (e.g. compile the kernel) before measuring
+    StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0, engine=engine).run_monte_carlo(
+        num_simulations=1, seed=2, keep_traces=False)
+    peaks = []
+    for hours in durations:
+        sim = StochasticProductionSimulation(create_base_config(), simulation_duration=3600.0 * hours, engine=engine)
+        tracemalloc.start()
+        sim.run_monte_carlo(num_simulations=1, seed=2, keep_traces=False)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    assert peaks[1] < 1.25 * peaks[0]
@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from sim import StochasticProductionSimulation, child_seed
+from splitting import estimate_overflow_probability, default_levels
+from test_sim import create_base_config
+
+def create_sim():
+    return StochasticProductionSimulation(
+        transition_config=create_base_config(),
+        simulation_duration=3600.0,
+        engine="kernel"
+    )
+
+def test_splitting_agrees_with_plain_monte_carlo():
+    """Test that the splitting estimate matches the empirical frequency of a moderately rare overflow"""
+    sim = create_sim()
+    batch = np.random.SeedSequence(1)
+    maxima = []
+    for i in range(1000):
+        sim.reset()
+        state = sim.run_single_simulation(seed=child_seed(batch, i))
+        maxima.append(max(state.buffer_levels["buffer2"]))
+    empirical = np.mean(np.array(maxima) >= 4)
+
+    estimate = estimate_overflow_probability(sim, "buffer2", 4, num_trajectories=500, seed=2)
+
+    assert estimate.levels == [1, 2, 3, 4]
+    assert len(estimate.level_probabilities) == 4
+    assert abs(estimate.probability - empirical) < 0.05
+
+def test_splitting_is_reproducible():
+    sim = create_sim()
+    first = estimate_overflow_probability(sim, "buffer2", 6, num_trajectories=100, seed=9)
+    second = estimate_overflow_probability(sim, "buffer2", 6, num_trajectories=100, seed=9)
+
+    assert first == second
+    assert 0 < first.probability < 1
+
+def test_splitting_rejects_bad_levels():
+    sim = create_sim()
+    with pytest.raises(ValueError):
+        estimate_overflow_probability(sim, "buffer2", 6, levels=[2, 4])
+    with pytest.raises(ValueError):
+        estimate_overflow_probability(sim, "buffer2", 6, levels=[3, 2, 6])
+    with pytest.raises(ValueError):
+        estimate_overflow_probability(sim, "buffer9", 6)
+
+def test_default_levels():
+    assert default_levels(8) == [2, 4, 6, 8]
+    assert default_levels(3) == [1, 2, 3]